@@ -0,0 +1,221 @@
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+
+# 无界面运行：报告中的图表使用非交互后端 (须在导入 matplotlib 之前设置)
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+from src.utils.tokens import DEFAULT_CONTEXT_TOKENS
+
+API_KEY_ENV = {
+    "deepseek": "DEEPSEEK_API_KEY",
+    "gemini": "GEMINI_API_KEY",
+    "openai": "OPENAI_API_KEY",
+}
+
+class ProgressPrinter:
+    """
+    向 stdout 输出一行一个 JSON 的进度事件 (机器可读)；阶段内部的日志被重定向到 stderr
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.start = time.time()
+
+    def emit(self, event, **fields):
+        fields = dict(event=event, elapsed=round(time.time() - self.start, 3), **fields)
+        self.stream.write(json.dumps(fields, ensure_ascii=False) + "\n")
+        self.stream.flush()
+
+    def callback(self, stage):
+        def progress_callback(done, total):
+            self.emit("progress", stage=stage, done=done, total=total)
+        return progress_callback
+
+def _add_common_args(parser):
+    parser.add_argument("--kb", default="knowledge_base", help="知识库文件或文件夹路径")
+    parser.add_argument("--provider", default="deepseek", choices=sorted(API_KEY_ENV))
+    parser.add_argument("--model", default=None, help="模型名称 (默认使用各提供商的默认模型)")
+    parser.add_argument("--api-key", default=None, help="API Key (默认读取 DEEPSEEK_API_KEY 等环境变量)")
+    parser.add_argument("--workers", type=int, default=1, help="各阶段的并发数")
+    parser.add_argument("--pool-size", type=int, default=None, help="HTTP 连接池大小")
+    parser.add_argument("--no-cache", action="store_true", help="旁路 LLM 响应缓存")
+    parser.add_argument("--no-parse-cache", action="store_true", help="旁路文件解析缓存")
+    parser.add_argument("--no-rate-limit", action="store_true", help="关闭客户端限流")
+    parser.add_argument("--rpm", type=int, default=None, help="每分钟请求数上限")
+    parser.add_argument("--tpm", type=int, default=None, help="每分钟 token 数上限")
+    parser.add_argument("--format", default="jsonl", choices=["jsonl", "json"], help="输出文件格式 (输入两种格式均可读取)")
+    parser.add_argument("--no-resume", action="store_true", help="忽略已有的运行日志，从头开始")
+    parser.add_argument("--context-tokens", type=int, default=DEFAULT_CONTEXT_TOKENS, help="生成/模拟阶段文档上下文的 token 预算")
+
+def _add_generate_args(parser):
+    parser.add_argument("--count", type=int, default=5)
+    parser.add_argument("--difficulty", default="混合")
+    parser.add_argument("--focus", default="事实查证", help="逗号分隔的考察重点")
+    parser.add_argument("--random-sampling", action="store_true")
+    parser.add_argument("--batch-size", type=int, default=1, help="每次请求生成的用例数")
+    parser.add_argument("--budget-tokens", type=int, default=None, help="读取知识库的总 token 预算")
+
+def _add_simulate_args(parser, with_input=True):
+    if with_input:
+        parser.add_argument("--dataset", required=True, help="测试集文件 (.jsonl 或 .json)")
+    parser.add_argument("--style", default="normal", choices=["normal", "hallucination", "verbose", "mixed"])
+    parser.add_argument("--retrieval", default="bm25", choices=["bm25", "dense", "hybrid", "full"])
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--hybrid-weights", type=float, nargs=2, default=(1.0, 1.0), metavar=("BM25", "DENSE"))
+
+def _add_score_args(parser, with_input=True):
+    if with_input:
+        parser.add_argument("--responses", required=True, help="回答集文件 (.jsonl 或 .json)")
+    parser.add_argument("--evidence-tokens", type=int, default=1000, help="每条评分证据的 token 预算")
+    parser.add_argument("--results-format", default="parquet", choices=["parquet", "jsonl", "json"],
+                        help="评分结果格式 (默认 Parquet 列式存储)")
+    parser.add_argument("--excel", action="store_true", help="额外导出 xlsx (较慢)")
+    parser.add_argument("--no-html", action="store_true", help="不生成 HTML 报告")
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m src.cli", description="RAG 测试工具命令行 (无界面)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("generate", help="生成测试集")
+    _add_common_args(p)
+    _add_generate_args(p)
+
+    p = sub.add_parser("simulate", help="模拟 RAG 回答")
+    _add_common_args(p)
+    _add_simulate_args(p)
+
+    p = sub.add_parser("score", help="评分并生成报告")
+    _add_common_args(p)
+    _add_score_args(p)
+
+    p = sub.add_parser("all", help="依次执行生成、模拟、评分")
+    _add_common_args(p)
+    _add_generate_args(p)
+    _add_simulate_args(p, with_input=False)
+    _add_score_args(p, with_input=False)
+    p.add_argument("--stream", action="store_true", help="流水线模式：生成、模拟、评分同时进行，逐条流转")
+    p.add_argument("--queue-size", type=int, default=16, help="流水线模式下阶段之间的队列容量")
+    return parser
+
+def pipeline_concurrency(args):
+    # 流水线模式下生成、模拟、评分三个阶段同时各占 workers 个并发请求
+    return args.workers * (3 if getattr(args, 'stream', False) else 1)
+
+def create_client(args):
+    # 缓存与限流配置通过环境变量传给进程内共享的默认实例，须在创建客户端前设置
+    if args.no_cache:
+        os.environ["RAG_LLM_CACHE"] = "off"
+    if args.no_parse_cache:
+        os.environ["RAG_PARSE_CACHE"] = "off"
+    if args.rpm:
+        os.environ["RAG_RPM"] = str(args.rpm)
+    if args.tpm:
+        os.environ["RAG_TPM"] = str(args.tpm)
+
+    from src.core.llm_client import LLMClientFactory, DEFAULT_POOL_SIZE
+    from src.core.llm_cache import get_default_cache
+
+    api_key = args.api_key or os.environ.get(API_KEY_ENV[args.provider], "")
+    if not api_key:
+        raise SystemExit(f"未找到 {args.provider} 的 API Key，请设置环境变量 '{API_KEY_ENV[args.provider]}' 或使用 --api-key")
+    return LLMClientFactory.create_client(args.provider, api_key, args.model,
+                                          pool_size=args.pool_size or DEFAULT_POOL_SIZE,
+                                          cache=get_default_cache(),
+                                          rate_limit=not args.no_rate_limit,
+                                          workers=pipeline_concurrency(args))
+
+def _generation_config(args):
+    return {
+        "count": args.count,
+        "difficulty": args.difficulty,
+        "focus": args.focus,
+        "random_sampling": args.random_sampling,
+        "workers": args.workers,
+        "batch_size": args.batch_size,
+        "context_tokens": args.context_tokens
+    }
+
+def run_generate(args, client, printer):
+    from src.core import pipeline
+    return pipeline.run_generate_cases(client, args.kb, os.path.isdir(args.kb), _generation_config(args),
+                                       progress_callback=printer.callback("generate"),
+                                       budget_tokens=args.budget_tokens, resume=not args.no_resume,
+                                       fmt=args.format)
+
+def run_simulate(args, client, printer, dataset_file):
+    from src.core import pipeline
+    return pipeline.run_get_responses_sim(client, args.kb, os.path.isdir(args.kb), dataset_file,
+                                          sim_style=args.style, retrieval=args.retrieval, top_k=args.top_k,
+                                          max_workers=args.workers, hybrid_weights=tuple(args.hybrid_weights),
+                                          context_tokens=args.context_tokens,
+                                          progress_callback=printer.callback("simulate"),
+                                          resume=not args.no_resume, fmt=args.format)
+
+def run_score(args, client, printer, responses_file):
+    from src.core import pipeline
+    return pipeline.run_scoring(client, args.kb, os.path.isdir(args.kb), responses_file,
+                                max_workers=args.workers, evidence_tokens=args.evidence_tokens,
+                                progress_callback=printer.callback("score"),
+                                excel=args.excel, html=not args.no_html,
+                                resume=not args.no_resume, results_format=args.results_format)
+
+def run_streaming(args, client, printer):
+    from src.core import pipeline
+
+    def progress_callback(stage, done, total):
+        printer.emit("progress", stage=stage, done=done, total=total)
+
+    return pipeline.run_streaming(client, args.kb, os.path.isdir(args.kb), _generation_config(args),
+                                  sim_style=args.style, retrieval=args.retrieval, top_k=args.top_k,
+                                  max_workers=args.workers, hybrid_weights=tuple(args.hybrid_weights),
+                                  context_tokens=args.context_tokens, evidence_tokens=args.evidence_tokens,
+                                  budget_tokens=args.budget_tokens, queue_size=args.queue_size,
+                                  progress_callback=progress_callback,
+                                  excel=args.excel, html=not args.no_html, fmt=args.format,
+                                  results_format=args.results_format)
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    printer = ProgressPrinter(sys.stdout)
+    stage = args.command
+    try:
+        # stdout 只输出 JSON 事件，阶段日志 (print) 转到 stderr
+        with contextlib.redirect_stdout(sys.stderr):
+            client = create_client(args)
+            if args.command == "all" and args.stream:
+                stage = "stream"
+                printer.emit("start", stage=stage)
+                outputs = run_streaming(args, client, printer)
+                printer.emit("done", stage=stage, **outputs)
+                return 0
+            if args.command in ("generate", "all"):
+                stage = "generate"
+                printer.emit("start", stage=stage)
+                outputs = run_generate(args, client, printer)
+                printer.emit("done", stage=stage, **outputs)
+                args.dataset = outputs["dataset_file"]
+            if args.command in ("simulate", "all"):
+                stage = "simulate"
+                printer.emit("start", stage=stage)
+                outputs = run_simulate(args, client, printer, args.dataset)
+                printer.emit("done", stage=stage, **outputs)
+                args.responses = outputs["responses_file"]
+            if args.command in ("score", "all"):
+                stage = "score"
+                printer.emit("start", stage=stage)
+                outputs = run_score(args, client, printer, args.responses)
+                printer.emit("done", stage=stage, **outputs)
+    except SystemExit as e:
+        printer.emit("error", stage=stage, message=str(e))
+        return 2
+    except Exception as e:
+        printer.emit("error", stage=stage, message=str(e))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# 各阶段的并发引擎：LLM 请求是阻塞 I/O，等待响应时释放 GIL，线程池中每个 worker 保持一个在途请求，
+# 并发数即 max_workers (连接池按并发数配置)，不另设协程实现
+DEFAULT_CONCURRENCY = 8
+
+def map_ordered(func, items, max_workers=DEFAULT_CONCURRENCY, progress_callback=None):
+    """
+    用线程池并发执行 func(item)，结果按 items 原顺序返回。
+    单条异常被捕获并以异常对象放在对应位置，不影响其他条目；
+    progress_callback(done, total) 在每条完成时调用 (完成顺序)。
+    """
+    items = list(items)
+    total = len(items)
+    results = [None] * total
+    if total == 0:
+        return results
+
+    workers = max(1, min(max_workers, total))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(func, item): i for i, item in enumerate(items)}
+        done = 0
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                results[i] = e
+            done += 1
+            if progress_callback:
+                progress_callback(done, total)
+    return results
+
+def imap_completed(func, items, max_workers=DEFAULT_CONCURRENCY):
+    """
+    用线程池并发执行 func(item)，按完成顺序逐个产出 (item, result)，不等待同批其他条目。
+    单条异常以异常对象作为 result 产出，不影响其他条目。
+    """
+    items = list(items)
+    if not items:
+        return
+    workers = max(1, min(max_workers, len(items)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(func, item): item for item in items}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = e
+            yield futures[future], result
+
+def imap_ordered(func, items, max_workers=DEFAULT_CONCURRENCY, window=None):
+    """
+    流式版 map_ordered：items 可以是任意迭代器 (如逐行读取的文件)，
+    最多提前提交 window 个任务 (默认 max_workers 的 4 倍)，按输入顺序逐个产出结果，内存占用与总条数无关。
+    单条异常以异常对象产出，不影响其他条目。
+    """
+    workers = max(1, max_workers)
+    window = window or workers * 4
+
+    def _result(future):
+        try:
+            return future.result()
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for item in items:
+            pending.append(pool.submit(func, item))
+            if len(pending) >= window:
+                yield _result(pending.popleft())
+        while pending:
+            yield _result(pending.popleft())
+
+# 流水线队列的结束标记
+STREAM_END = object()
+
+def start_stage(func, inbox, outbox, workers=1, error_callback=None):
+    """
+    启动一个流水线阶段：workers 个线程从 inbox 取记录，func(record) 的结果放入 outbox。
+    队列均为有界队列时，下游处理不过来会阻塞上游 put，形成反压。
+    func 抛出异常时调用 error_callback(record, exc) 并丢弃该条；返回 None 的记录也被丢弃。
+    inbox 读到 STREAM_END 后各线程退出，最后一个退出的线程向 outbox 传递 STREAM_END。
+    返回线程列表。
+    """
+    workers = max(1, workers)
+    state = {"alive": workers}
+    lock = threading.Lock()
+
+    def _worker():
+        while True:
+            record = inbox.get()
+            if record is STREAM_END:
+                # 放回结束标记，让同阶段的其他线程也能看到
+                inbox.put(STREAM_END)
+                break
+            try:
+                result = func(record)
+            except Exception as e:
+                if error_callback:
+                    error_callback(record, e)
+                continue
+            if result is not None:
+                outbox.put(result)
+        with lock:
+            state["alive"] -= 1
+            last = state["alive"] == 0
+        if last:
+            outbox.put(STREAM_END)
+
+    threads = [threading.Thread(target=_worker, daemon=True) for _ in range(workers)]
+    for t in threads:
+        t.start()
+    return threads
@@ -1,10 +1,62 @@
 import json
+import hashlib
+import threading
+from src.utils.tokens import get_token_estimator
 
 class Evaluator:
-    def __init__(self, client):
+    def __init__(self, client, kb=None, retriever=None, evidence_tokens=1000, top_k=8):
+        """
+        传入 kb 与 retriever (KnowledgeBase 上的检索器) 时，按每条用例的
+        问题 + 参考答案 + RAG 回答检索证据片段，在 evidence_tokens 的 token 预算内作为背景文档；
+        否则使用 doc_content 在该预算内的前缀。
+        """
         self.client = client
+        self.kb = kb
+        self.retriever = retriever
+        self.evidence_tokens = evidence_tokens
+        self.estimator = get_token_estimator(getattr(client, 'PROVIDER', 'default'))
+        self.top_k = top_k
+        self._evidence_cache = {}
+        self._evidence_lock = threading.Lock()
 
-    def evaluate(self, item, doc_content):
+    def select_evidence(self, item, doc_content=None):
+        if self.retriever is None or self.kb is None:
+            return f"{self.estimator.truncate(doc_content or '', self.evidence_tokens)}..."
+
+        query = "\n".join([
+            str(item.get('question', '')),
+            str(item.get('reference_answer', '')),
+            str(item.get('rag_answer', ''))
+        ])
+        key = hashlib.sha1(query.encode('utf-8')).hexdigest()
+        with self._evidence_lock:
+            if key in self._evidence_cache:
+                return self._evidence_cache[key]
+
+        parts = []
+        used = 0
+        for chunk_id, _ in self.retriever.search(query, self.top_k):
+            part = self.kb.format_chunks([chunk_id])
+            remaining = self.evidence_tokens - used
+            if remaining <= 0:
+                break
+            cost = self.estimator.count(part)
+            if cost > remaining:
+                # 第一个片段就超出预算时截断使用，否则跳过放不下的片段
+                if parts:
+                    continue
+                part = self.estimator.truncate(part, remaining) + "..."
+                cost = remaining
+            parts.append(part)
+            used += cost
+        evidence = "\n\n".join(parts) or "(未检索到相关文档片段)"
+
+        with self._evidence_lock:
+            self._evidence_cache[key] = evidence
+        return evidence
+
+    def _build_messages(self, item, doc_content):
+        evidence = self.select_evidence(item, doc_content)
         prompt = f"""请作为公正的裁判，对 RAG 系统的回答进行打分。
 
 [用户问题]
@@ -20,7 +72,7 @@ class Evaluator:
 {item.get('rag_answer', '')}
 
 [背景文档片段 (仅供参考)]
-{doc_content[:2000]}...
+{evidence}
 
 请从以下维度评分 (1-5分):
 1. 忠实度 (Faithfulness): 是否包含幻觉？是否符合文档？
@@ -37,14 +89,26 @@ class Evaluator:
     "relevance_reason": "..."
 }}
 """
-        messages = [{"role": "user", "content": prompt}]
-        result = self.client.chat(messages, temperature=0.0)
+        return [{"role": "user", "content": prompt}]
+
+    def _parse_result(self, result):
         try:
             clean = result.replace("```json", "").replace("```", "").strip()
             return json.loads(clean)
         except:
-            return {
-                "faithfulness_score": 0, "faithfulness_reason": "评分解析失败",
-                "completeness_score": 0, "completeness_reason": "评分解析失败",
-                "relevance_score": 0, "relevance_reason": "评分解析失败"
-            }
+            return self.failed_result("评分解析失败")
+
+    @staticmethod
+    def failed_result(reason):
+        # 未得到评分时分数为空 (不是 0 分)，汇总与报告中的平均分不计入这些条目
+        return {
+            "faithfulness_score": None, "faithfulness_reason": reason,
+            "completeness_score": None, "completeness_reason": reason,
+            "relevance_score": None, "relevance_reason": reason,
+            "error": reason
+        }
+
+    def evaluate(self, item, doc_content=None):
+        messages = self._build_messages(item, doc_content)
+        result = self.client.chat(messages, temperature=0.0)
+        return self._parse_result(result)
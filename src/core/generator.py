@@ -1,16 +1,31 @@
 import json
 import random
+import re
+from src.core.concurrency import imap_completed
+from src.utils.tokens import get_token_estimator, DEFAULT_CONTEXT_TOKENS
 
-def generate_single_case(client, doc_content, config, existing_questions=None):
+def _estimator_for(client):
+    return get_token_estimator(getattr(client, 'PROVIDER', 'default'))
+
+def build_case_messages(doc_content, config, existing_questions=None, n=1, estimator=None):
     difficulty = config.get('difficulty', "混合")
     focus = config.get('focus', "事实查证")
     random_sampling = config.get('random_sampling', False)
     
-    # Context handling
-    limit = 100000
+    # Context handling (按 token 预算截取，limit 为预算对应的大致字符数)
+    estimator = estimator or get_token_estimator()
+    context_tokens = config.get('context_tokens', DEFAULT_CONTEXT_TOKENS)
+    limit = estimator.chars_for_tokens(doc_content, context_tokens)
     content_to_use = doc_content
+    region = config.get('region')
     if len(doc_content) > limit:
-        if random_sampling:
+        if region:
+            # 并行生成时按 slot 分配不同的文档区域 (index, count)，让各生成器看到不同内容
+            index, region_count = region
+            step = (len(doc_content) - limit) / max(1, region_count - 1)
+            start = int(step * (index % region_count))
+            content_to_use = doc_content[start : start + limit]
+        elif random_sampling:
             start = random.randint(0, len(doc_content) - limit)
             content_to_use = doc_content[start : start + limit]
             try:
@@ -21,6 +36,7 @@ def generate_single_case(client, doc_content, config, existing_questions=None):
                 pass
         else:
             content_to_use = doc_content[:limit]
+        content_to_use = estimator.truncate(content_to_use, context_tokens)
 
     # Difficulty descriptions
     difficulty_descriptions = {
@@ -61,7 +77,14 @@ def generate_single_case(client, doc_content, config, existing_questions=None):
         q_list_str = "\n".join([f"- {q}" for q in recent_questions])
         avoid_instruction = f"5. 避免重复（Critical）：\n绝对不要生成与以下已生成问题语义相似的内容，必须另辟蹊径：\n{q_list_str}\n"
 
-    prompt = f"""请阅读以下文档，并生成 1 个高质量的测试用例，用于评估 RAG 系统的能力。
+    if n > 1:
+        count_instruction = f"{n} 个互不重复、覆盖文档不同部分和不同问题角度的高质量测试用例"
+        format_instruction = f"JSON 数组 (question, type, reference_answer, evaluation_criteria) —— 数组中恰好包含 {n} 个元素，每个元素是一个独立的测试用例。"
+    else:
+        count_instruction = "1 个高质量的测试用例"
+        format_instruction = "JSON 数组 (question, type, reference_answer, evaluation_criteria) —— 注意：虽然只生成1个，但仍请包裹在数组中。"
+
+    prompt = f"""请阅读以下文档，并生成 {count_instruction}，用于评估 RAG 系统的能力。
     
 生成要求：
 1. 难度级别：{diff_instruction}
@@ -74,7 +97,7 @@ def generate_single_case(client, doc_content, config, existing_questions=None):
    - 提问应直击要点，类似搜索引擎查询或向专业助手提问的风格。
    - 示例（Good）："MyvibeSoft的创始人是谁？"、"如何申请年假？"、"VPN连接失败的解决方法"
    - 示例（Bad）："请根据提供的文档内容，详细阐述MyvibeSoft公司的创始人分别是谁以及他们的背景。"（太长、太书面）
-4. 输出格式：JSON 数组 (question, type, reference_answer, evaluation_criteria) —— 注意：虽然只生成1个，但仍请包裹在数组中。
+4. 输出格式：{format_instruction}
 {avoid_instruction}
 特别注意：
 对于“抗干扰/无答案”类问题（即文档中没有答案的问题）：
@@ -89,32 +112,208 @@ def generate_single_case(client, doc_content, config, existing_questions=None):
 
 请严格以 JSON 数组格式输出。
 """
-    messages = [{"role": "user", "content": prompt}]
-    
+    return [{"role": "user", "content": prompt}]
+
+def parse_case_result(result):
+    clean_result = result.replace("```json", "").replace("```", "").strip()
+    data = json.loads(clean_result)
+    if isinstance(data, list) and len(data) > 0:
+        return data[0]
+    elif isinstance(data, dict):
+        return data
+    else:
+        raise Exception("Invalid JSON structure")
+
+def parse_case_list(result):
+    clean_result = result.replace("```json", "").replace("```", "").strip()
+    data = json.loads(clean_result)
+    if isinstance(data, dict):
+        return [data]
+    elif isinstance(data, list):
+        return data
+    else:
+        raise Exception("Invalid JSON structure")
+
+def validate_case(item):
+    """
+    校验单个用例结构，合法时返回补全后的用例，否则返回 None
+    """
+    if not isinstance(item, dict):
+        return None
+    question = item.get('question')
+    reference_answer = item.get('reference_answer')
+    if not isinstance(question, str) or not question.strip():
+        return None
+    if reference_answer is None or not str(reference_answer).strip():
+        return None
+    case = dict(item)
+    case['question'] = question.strip()
+    case.setdefault('type', "未分类")
+    case.setdefault('evaluation_criteria', "无")
+    return case
+
+def generate_case_batch(client, doc_content, config, n, existing_questions=None):
+    """
+    单次调用生成 n 个用例，逐个校验，只返回合法的元素 (可能少于 n 个)
+    """
+    messages = build_case_messages(doc_content, config, existing_questions, n=n, estimator=_estimator_for(client))
     try:
-        result = client.chat(messages)
-        clean_result = result.replace("```json", "").replace("```", "").strip()
-        data = json.loads(clean_result)
-        if isinstance(data, list) and len(data) > 0:
-            return data[0]
-        elif isinstance(data, dict):
-            return data
-        else:
-            raise Exception("Invalid JSON structure")
+        data = parse_case_list(client.chat(messages))
     except Exception as e:
-        print(f"单条生成失败: {str(e)}")
-        # Return Error Item
-        return {
-            "question": f"生成失败: {str(e)}",
-            "type": "Error",
-            "reference_answer": "无",
-            "evaluation_criteria": "无"
-        }
-
-def generate_test_cases(client, doc_content, config, progress_callback=None):
+        print(f"批量生成失败: {str(e)}")
+        return []
+    valid = [case for case in (validate_case(item) for item in data) if case]
+    if len(valid) < len(data):
+        print(f"批量生成中有 {len(data) - len(valid)} 个用例格式无效，已丢弃")
+    return valid[:n]
+
+def _error_case(e):
+    print(f"单条生成失败: {str(e)}")
+    # Return Error Item
+    return {
+        "question": f"生成失败: {str(e)}",
+        "type": "Error",
+        "reference_answer": "无",
+        "evaluation_criteria": "无"
+    }
+
+def generate_single_case(client, doc_content, config, existing_questions=None):
+    messages = build_case_messages(doc_content, config, existing_questions, estimator=_estimator_for(client))
+    try:
+        return parse_case_result(client.chat(messages))
+    except Exception as e:
+        return _error_case(e)
+
+def _normalize_question(question):
+    # 去除大小写、空白和标点差异，用于判定重复问题
+    return re.sub(r"[\W_]+", "", str(question).lower())
+
+def _generate_parallel(client, doc_content, config, progress_callback=None, case_callback=None, existing_questions=None):
+    """
+    并行生成模式：每轮把所有待填充的 slot 分发给线程池，
+    每个 slot 使用不同的文档区域和侧重点；每个 slot 完成后立即去重并回调 (不等待本轮其他 slot)，
+    被拒绝的 slot 在下一轮重试。
+    """
+    count = config.get('count', 5)
+    workers = config.get('workers', 4)
+    max_retries = 3
+    
+    focus_list = [f.strip() for f in config.get('focus', "事实查证").split(',') if f.strip()] or ["事实查证"]
+    region_count = max(1, min(count, workers))
+    
+    slots = [None] * count
+    existing_questions = list(existing_questions or [])
+    seen = {_normalize_question(q) for q in existing_questions}
+    pending = list(range(count))
+    done = 0
+    
+    for attempt in range(max_retries):
+        if not pending:
+            break
+        
+        def generate_slot(slot):
+            slot_config = dict(config)
+            slot_config['focus'] = focus_list[(slot + attempt) % len(focus_list)]
+            slot_config['region'] = ((slot + attempt) % region_count, region_count)
+            # 本轮开始时已接受的问题作为 avoid 列表 (快照，不依赖串行顺序)
+            return generate_single_case(client, doc_content, slot_config, existing_questions)
+        
+        rejected = []
+        for slot, item in imap_completed(generate_slot, pending, workers):
+            if isinstance(item, Exception) or item.get("type") == "Error":
+                print(f"Skipping failed generation item {slot+1} (Attempt {attempt+1})")
+                rejected.append(slot)
+                continue
+            
+            key = _normalize_question(item.get('question', ''))
+            if not key or key in seen:
+                print(f"Duplicate question detected: {item.get('question')}. Retrying ({attempt+1}/{max_retries})...")
+                rejected.append(slot)
+                continue
+            
+            seen.add(key)
+            existing_questions.append(item['question'])
+            slots[slot] = item
+            done += 1
+            if case_callback:
+                case_callback(item)
+            if progress_callback:
+                progress_callback(done, count)
+        
+        pending = rejected
+    
+    if pending:
+        print(f"Skipping {len(pending)} items after max retries")
+    return [item for item in slots if item is not None]
+
+def _generate_batched(client, doc_content, config, progress_callback=None, case_callback=None, existing_questions=None):
+    """
+    批量生成模式：每次调用请求 batch_size 个用例，共享同一份文档上下文；
+    校验/去重后只为缺失的数量重新请求。workers > 1 时多个批次并行发出，每个批次返回后立即去重并回调。
+    """
+    count = config.get('count', 5)
+    batch_size = max(1, config.get('batch_size', 5))
+    workers = max(1, config.get('workers', 1))
+    max_rounds = 3
+    
+    results = []
+    existing_questions = list(existing_questions or [])
+    seen = {_normalize_question(q) for q in existing_questions}
+    
+    for attempt in range(max_rounds):
+        need = count - len(results)
+        if need <= 0:
+            break
+        
+        batches = []
+        while need > 0:
+            batches.append(min(batch_size, need))
+            need -= batches[-1]
+        region_count = max(1, len(batches))
+        
+        def generate_batch(args):
+            index, n = args
+            batch_config = dict(config)
+            if len(batches) > 1:
+                batch_config['region'] = ((index + attempt) % region_count, region_count)
+            return generate_case_batch(client, doc_content, batch_config, n, existing_questions)
+        
+        for _, outcome in imap_completed(generate_batch, list(enumerate(batches)), workers):
+            if isinstance(outcome, Exception):
+                print(f"批量生成失败: {outcome}")
+                continue
+            for item in outcome:
+                if len(results) >= count:
+                    break
+                key = _normalize_question(item['question'])
+                if key in seen:
+                    print(f"Duplicate question detected: {item['question']}. Will re-request ({attempt+1}/{max_rounds})...")
+                    continue
+                seen.add(key)
+                existing_questions.append(item['question'])
+                results.append(item)
+                if case_callback:
+                    case_callback(item)
+                if progress_callback:
+                    progress_callback(len(results), count)
+    
+    if len(results) < count:
+        print(f"Skipping {count - len(results)} items after max retries")
+    return results
+
+def generate_test_cases(client, doc_content, config, progress_callback=None, case_callback=None, existing_questions=None):
+    """
+    生成测试用例列表；case_callback(item) 在每条用例通过校验/去重后立即调用，供流水线模式逐条下发。
+    existing_questions 为已有用例的问题 (断点续跑时)，新用例会避开这些问题；config['count'] 为本次需要新生成的数量。
+    """
+    if config.get('batch_size', 1) > 1:
+        return _generate_batched(client, doc_content, config, progress_callback, case_callback, existing_questions)
+    if config.get('workers', 1) > 1:
+        return _generate_parallel(client, doc_content, config, progress_callback, case_callback, existing_questions)
+    
     count = config.get('count', 5)
     results = []
-    existing_questions = []
+    existing_questions = list(existing_questions or [])
     
     for i in range(count):
         if progress_callback:
@@ -142,6 +341,8 @@ def generate_test_cases(client, doc_content, config, progress_callback=None):
             # Valid and Unique
             existing_questions.append(item['question'])
             results.append(item)
+            if case_callback:
+                case_callback(item)
             break # Success, move to next item
         
     return results
@@ -3,20 +3,96 @@ import json
 import time
 import os
 import re
+import threading
+from requests.adapters import HTTPAdapter
 import google.generativeai as genai
 from google.api_core import exceptions as google_exceptions
 from src.utils.logger import log_debug
+from src.core.rate_limiter import get_rate_limiter, estimate_message_tokens
+
+# HTTP 连接池默认大小 (同一 host 的最大复用连接数)
+DEFAULT_POOL_SIZE = 16
+
+_SESSION_LOCK = threading.Lock()
+_SESSIONS = {}
+
+# 各线程在限流器中累计等待的秒数 (chat 内部排队的时间，调用方计时时需扣除)
+_THROTTLE_WAITS = threading.local()
+
+def get_http_session(pool_size=DEFAULT_POOL_SIZE, keep_alive=True):
+    """
+    获取共享的 requests.Session (按连接池配置缓存)。
+    同一进程内生成/模拟/评分各阶段复用同一连接池，避免每次请求重新 TCP+TLS 握手。
+    """
+    key = (pool_size, keep_alive)
+    with _SESSION_LOCK:
+        session = _SESSIONS.get(key)
+        if session is None:
+            session = requests.Session()
+            # 重试由各 Client 自己控制，这里不让 urllib3 再重试
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers["Connection"] = "keep-alive" if keep_alive else "close"
+            _SESSIONS[key] = session
+        return session
 
 class LLMClient:
+    PROVIDER = "generic"
+    # 响应缓存 (ResponseCache)，默认只缓存 temperature == 0 的确定性调用
+    cache = None
+    cache_all_temperatures = False
+    # 发送前是否经过 (provider, model) 共享的令牌桶限流
+    rate_limit = False
+
     def chat(self, messages, model=None, temperature=0.7, retries=3, timeout=90):
         raise NotImplementedError
 
+    def _cache_key(self, model, messages, temperature):
+        if self.cache is None or not self.cache.enabled:
+            return None
+        if temperature != 0 and not self.cache_all_temperatures:
+            return None
+        return self.cache.make_key(self.PROVIDER, model, messages, temperature)
+
+    def _cache_get(self, key):
+        if key is None:
+            return None
+        content = self.cache.get(key)
+        if content is not None:
+            log_debug(f"[{self.PROVIDER}] Cache hit: {key[:12]}")
+        return content
+
+    def _cache_put(self, key, content):
+        if key is not None and content is not None:
+            self.cache.put(key, content)
+
+    def _throttle(self, model, messages):
+        if not self.rate_limit:
+            return
+        waited = get_rate_limiter(self.PROVIDER, model).acquire(estimate_message_tokens(messages, self.PROVIDER))
+        if waited > 0:
+            _THROTTLE_WAITS.seconds = getattr(_THROTTLE_WAITS, 'seconds', 0.0) + waited
+            log_debug(f"[{self.PROVIDER}] Throttled {waited:.2f}s by rate limiter")
+
+    def pop_throttle_wait(self):
+        """
+        返回当前线程自上次调用以来在限流器中等待的秒数并清零
+        """
+        waited = getattr(_THROTTLE_WAITS, 'seconds', 0.0)
+        _THROTTLE_WAITS.seconds = 0.0
+        return waited
+
 class DeepSeekClient(LLMClient):
+    PROVIDER = "deepseek"
     API_URL = "https://api.deepseek.com/chat/completions"
 
-    def __init__(self, api_key, default_model="deepseek-chat"):
+    def __init__(self, api_key, default_model="deepseek-chat", pool_size=DEFAULT_POOL_SIZE, keep_alive=True, session=None):
         self.api_key = api_key
         self.default_model = default_model
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self.session = session or get_http_session(pool_size, keep_alive)
         self.headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {api_key}"
@@ -31,12 +107,18 @@ class DeepSeekClient(LLMClient):
             "stream": False
         }
         
+        cache_key = self._cache_key(target_model, messages, temperature)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+        
         log_debug(f"[DeepSeek] Request: {self.API_URL}\nPayload: {json.dumps(data, ensure_ascii=False)[:500]}...")
         
         last_exception = None
         for attempt in range(retries):
             try:
-                response = requests.post(
+                self._throttle(target_model, messages)
+                response = self.session.post(
                     self.API_URL, 
                     headers=self.headers, 
                     json=data, 
@@ -48,6 +130,7 @@ class DeepSeekClient(LLMClient):
                 content = resp_json['choices'][0]['message']['content']
                 
                 log_debug(f"[DeepSeek] Response: {content[:200]}...")
+                self._cache_put(cache_key, content)
                 return content
             except Exception as e:
                 last_exception = e
@@ -61,14 +144,13 @@ class DeepSeekClient(LLMClient):
         raise last_exception
 
 class GeminiClient(LLMClient):
+    PROVIDER = "gemini"
     def __init__(self, api_key, default_model="gemini-2.0-flash-exp"):
         self.api_key = api_key
         self.default_model = default_model
         genai.configure(api_key=api_key)
 
-    def chat(self, messages, model=None, temperature=0.7, retries=3, timeout=90):
-        target_model = model or self.default_model
-        
+    def _convert_messages(self, messages):
         # Convert messages to Gemini format
         system_instruction = None
         contents = []
@@ -82,6 +164,34 @@ class GeminiClient(LLMClient):
                 contents.append({'role': 'user', 'parts': [content]})
             elif role == 'assistant':
                 contents.append({'role': 'model', 'parts': [content]})
+        return system_instruction, contents
+
+    def _retry_wait(self, e, attempt):
+        wait_time = 2 * (attempt + 1)
+        
+        # Special handling for ResourceExhausted (429)
+        if isinstance(e, google_exceptions.ResourceExhausted) or "429" in str(e):
+            # Try to parse retry_delay from error message
+            # Pattern: retry_delay { seconds: 27 }
+            match = re.search(r"retry_delay\s*\{\s*seconds:\s*(\d+)\s*\}", str(e))
+            if match:
+                delay = int(match.group(1))
+                wait_time = delay + 2 # Add a small buffer
+                log_debug(f"[Gemini] Rate limited. Waiting for {wait_time}s (from error info)...")
+            else:
+                # Default long wait for 429 if no specific delay provided
+                wait_time = 30 * (attempt + 1)
+                log_debug(f"[Gemini] Rate limited. Waiting for {wait_time}s (default backoff)...")
+        return wait_time
+
+    def chat(self, messages, model=None, temperature=0.7, retries=3, timeout=90):
+        target_model = model or self.default_model
+        cache_key = self._cache_key(target_model, messages, temperature)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+        
+        system_instruction, contents = self._convert_messages(messages)
         
         log_debug(f"[Gemini] Model: {target_model}, System: {system_instruction[:50] if system_instruction else 'None'}...")
         
@@ -97,6 +207,7 @@ class GeminiClient(LLMClient):
                     system_instruction=system_instruction
                 )
                 
+                self._throttle(target_model, messages)
                 response = generative_model.generate_content(
                     contents,
                     generation_config=generation_config,
@@ -105,38 +216,27 @@ class GeminiClient(LLMClient):
                 
                 text = response.text
                 log_debug(f"[Gemini] Response: {text[:200]}...")
+                self._cache_put(cache_key, text)
                 return text
             except Exception as e:
                 last_exception = e
                 log_debug(f"[Gemini] Error (Attempt {attempt+1}/{retries}): {str(e)}")
                 
                 if attempt < retries - 1:
-                    wait_time = 2 * (attempt + 1)
-                    
-                    # Special handling for ResourceExhausted (429)
-                    if isinstance(e, google_exceptions.ResourceExhausted) or "429" in str(e):
-                        # Try to parse retry_delay from error message
-                        # Pattern: retry_delay { seconds: 27 }
-                        match = re.search(r"retry_delay\s*\{\s*seconds:\s*(\d+)\s*\}", str(e))
-                        if match:
-                            delay = int(match.group(1))
-                            wait_time = delay + 2 # Add a small buffer
-                            log_debug(f"[Gemini] Rate limited. Waiting for {wait_time}s (from error info)...")
-                        else:
-                            # Default long wait for 429 if no specific delay provided
-                            wait_time = 30 * (attempt + 1)
-                            log_debug(f"[Gemini] Rate limited. Waiting for {wait_time}s (default backoff)...")
-                    
-                    time.sleep(wait_time)
+                    time.sleep(self._retry_wait(e, attempt))
                     
         raise last_exception
 
 class OpenAIClient(LLMClient):
+    PROVIDER = "openai"
     API_URL = "https://api.openai.com/v1/chat/completions"
 
-    def __init__(self, api_key, default_model="gpt-4o"):
+    def __init__(self, api_key, default_model="gpt-4o", pool_size=DEFAULT_POOL_SIZE, keep_alive=True, session=None):
         self.api_key = api_key
         self.default_model = default_model
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self.session = session or get_http_session(pool_size, keep_alive)
         self.headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {api_key}"
@@ -151,12 +251,18 @@ class OpenAIClient(LLMClient):
             "stream": False
         }
         
+        cache_key = self._cache_key(target_model, messages, temperature)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+        
         log_debug(f"[OpenAI] Request: {self.API_URL}\nPayload: {json.dumps(data, ensure_ascii=False)[:500]}...")
         
         last_exception = None
         for attempt in range(retries):
             try:
-                response = requests.post(
+                self._throttle(target_model, messages)
+                response = self.session.post(
                     self.API_URL, 
                     headers=self.headers, 
                     json=data, 
@@ -168,6 +274,7 @@ class OpenAIClient(LLMClient):
                 content = resp_json['choices'][0]['message']['content']
                 
                 log_debug(f"[OpenAI] Response: {content[:200]}...")
+                self._cache_put(cache_key, content)
                 return content
             except Exception as e:
                 last_exception = e
@@ -182,12 +289,18 @@ class OpenAIClient(LLMClient):
 
 class LLMClientFactory:
     @staticmethod
-    def create_client(provider, api_key, model_name=None):
+    def create_client(provider, api_key, model_name=None, pool_size=DEFAULT_POOL_SIZE, keep_alive=True, cache=None, rate_limit=True,
+                      workers=1):
+        # 连接池不小于并发数，否则超出的连接用完即被 urllib3 丢弃，失去 keep-alive 复用
+        pool_size = max(pool_size, workers or 1)
         if provider.lower() == "deepseek":
-            return DeepSeekClient(api_key, model_name or "deepseek-chat")
+            client = DeepSeekClient(api_key, model_name or "deepseek-chat", pool_size=pool_size, keep_alive=keep_alive)
         elif provider.lower() == "gemini":
-            return GeminiClient(api_key, model_name or "gemini-2.0-flash-exp")
+            client = GeminiClient(api_key, model_name or "gemini-2.0-flash-exp")
         elif provider.lower() == "openai":
-            return OpenAIClient(api_key, model_name or "gpt-4o")
+            client = OpenAIClient(api_key, model_name or "gpt-4o", pool_size=pool_size, keep_alive=keep_alive)
         else:
             raise ValueError(f"Unknown provider: {provider}")
+        client.cache = cache
+        client.rate_limit = rate_limit
+        return client
@@ -0,0 +1,394 @@
+import os
+import time
+import itertools
+import queue
+import datetime
+import threading
+from src.core.simulator import AdvancedRAGSimulator
+from src.core.vector_index import DenseRetriever
+from src.core.retriever import BM25Retriever, HybridRetriever
+from src.core.evaluator import Evaluator
+from src.core.generator import generate_test_cases
+from src.core.concurrency import imap_ordered, start_stage, STREAM_END
+from src.utils.file_loader import read_knowledge_base
+from src.utils.knowledge_base import load_knowledge_base
+from src.utils.journal import RunJournal, item_id, journal_path, DEFAULT_JOURNAL_DIR
+from src.utils.tokens import DEFAULT_CONTEXT_TOKENS
+from src.utils.records import RecordWriter, iter_records, count_records, DEFAULT_FORMAT
+from src.utils.results_store import (open_results_writer, load_results, summarize_results, export_excel,
+                                     parquet_available, SCORE_COLUMNS)
+
+# 评分结果的默认格式 (列式存储)
+DEFAULT_RESULTS_FORMAT = "parquet"
+
+# 三个阶段的无界面实现，GUI (WorkerThread) 与命令行 (src.cli) 共用。
+# 进度通过 progress_callback(done, total) 回调，日志用 print 输出。
+# 各阶段的输入可以是 JSON Lines 或旧版 JSON 数组，输出默认为 JSON Lines，逐条读取、逐条写出。
+# 各阶段把完成的记录追加到运行日志 (outputs/journals)，中断后以相同输入和参数重跑时跳过已完成的条目。
+
+def get_timestamp():
+    return datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+
+def open_journal(stage, resume, journal_dir, *parts):
+    """
+    打开阶段运行日志，返回 (journal, 已完成的 {item_id: record})；resume=False 时丢弃旧日志重新开始
+    """
+    journal = RunJournal(journal_path(stage, *parts, journal_dir=journal_dir))
+    if not resume:
+        journal.discard()
+        return journal, {}
+    done = journal.load()
+    if done:
+        print(f"断点续跑: {stage} 阶段已完成 {len(done)} 条，将跳过 ({journal.path})")
+    return journal, done
+
+def finish_journal(journal, complete):
+    """
+    complete=True 时删除日志；否则保留 (模拟/评分仍有失败条目，或运行被中断)，重跑只处理未完成的条目
+    """
+    if complete:
+        journal.discard()
+    else:
+        journal.close()
+        print(f"部分条目未完成，运行日志已保留，重跑将只处理这些条目: {journal.path}")
+
+def _offset_progress(progress_callback, offset, total):
+    # 续跑时进度包含已完成的条目
+    if progress_callback is None:
+        return None
+    return lambda done, _: progress_callback(offset + done, total)
+
+def load_generation_context(client, kb_path, is_dir, config, budget_tokens=None):
+    """
+    读取用于生成测试集的知识库文本 (按预算截断)
+    """
+    # 如果启用了随机采样，同时打乱文件读取顺序，保证多文档时的随机性
+    shuffle_files = config.get('random_sampling', False)
+    doc_content, kb_report = read_knowledge_base(kb_path, is_dir, shuffle_files=shuffle_files,
+                                                 workers=os.cpu_count(), return_report=True,
+                                                 budget_tokens=budget_tokens, provider=client.PROVIDER)
+    if not doc_content: raise Exception("知识库为空")
+    for entry in kb_report:
+        if entry['truncated']:
+            print(f"知识库配额: {entry['file']} 纳入 {entry['end']}/{entry['length']} 字符")
+    return doc_content
+
+def output_path(output_dir, prefix, fmt=DEFAULT_FORMAT, ts=None):
+    # 确保目录存在
+    os.makedirs(output_dir, exist_ok=True)
+    return f"{output_dir}/{prefix}_{ts or get_timestamp()}.{fmt}"
+
+def run_generate_cases(client, kb_path, is_dir, config, progress_callback=None,
+                       output_dir="outputs/datasets", budget_tokens=None,
+                       resume=True, journal_dir=DEFAULT_JOURNAL_DIR, fmt=DEFAULT_FORMAT):
+    """
+    读取知识库并生成测试集 (每条通过校验后立即写出)，返回 {"dataset_file": 路径}
+    """
+    count = config.get('count', 5)
+    journal, done = open_journal("generate", resume, journal_dir, os.path.abspath(kb_path),
+                                 client.PROVIDER, client.default_model, count,
+                                 config.get('difficulty'), config.get('focus'))
+    previous = list(done.values())[:count]
+    output_file = output_path(output_dir, "test_dataset", fmt)
+    try:
+        with RecordWriter(output_file) as writer:
+            for case in previous:
+                writer.write(case)
+
+            def on_case(item):
+                writer.write(item)
+                journal.append(item_id(item), item)
+
+            if len(previous) < count:
+                doc_content = load_generation_context(client, kb_path, is_dir, config, budget_tokens)
+                print(f"正在生成测试集 (Provider={client.PROVIDER}, Model={client.default_model}, Count={count})...")
+                generate_test_cases(client, doc_content, dict(config, count=count - len(previous)),
+                                    _offset_progress(progress_callback, len(previous), count),
+                                    on_case, [case['question'] for case in previous])
+            written = writer.count
+    except BaseException:
+        # 运行被中断 (异常或 Ctrl+C) 时保留日志，重跑从已生成的用例继续
+        finish_journal(journal, False)
+        raise
+
+    print(f"测试集已保存至 {output_file}")
+    if written < count:
+        print(f"生成完成，但只得到 {written}/{count} 条有效用例 (去重或解析失败)")
+    # 正常结束即删除日志：数量不足不是中断，下次生成应重新开始而不是复用这批用例
+    finish_journal(journal, True)
+    return {"dataset_file": output_file}
+
+def build_simulator(client, kb_path, is_dir, sim_style="normal", retrieval="bm25", top_k=5,
+                    hybrid_weights=(1.0, 1.0), context_tokens=DEFAULT_CONTEXT_TOKENS):
+    """
+    按检索方式 (bm25/dense/hybrid/full) 加载知识库并构建模拟器
+    """
+    if retrieval == 'full':
+        kb = read_knowledge_base(kb_path, is_dir, workers=os.cpu_count())
+    else:
+        kb = load_knowledge_base(kb_path, is_dir, workers=os.cpu_count())
+
+    retriever = None
+    if retrieval == 'dense':
+        retriever = DenseRetriever.load_or_build(kb)
+    elif retrieval == 'hybrid':
+        bm25_weight, dense_weight = hybrid_weights
+        retriever = HybridRetriever([
+            (BM25Retriever(kb), bm25_weight),
+            (DenseRetriever.load_or_build(kb), dense_weight)
+        ])
+    return AdvancedRAGSimulator(client, kb, style=sim_style, retriever=retriever, top_k=top_k,
+                                context_tokens=context_tokens)
+
+def simulate_case(simulator, case):
+    """
+    模拟单条用例，返回附加了回答与各阶段耗时的记录
+    """
+    # 计时从 worker 真正开始处理时算起，不包含在线程池中排队的时间，也不包含在限流器中等待的时间
+    start = time.perf_counter()
+    trace = simulator.generate_response_with_trace(case['question'])
+    rec = case.copy()
+    rec['sim_style'] = simulator.style
+    rec['rag_answer'] = trace['answer']
+    rec['latency'] = time.perf_counter() - start - trace.get('throttle_time', 0.0)
+    rec['throttle_wait'] = trace.get('throttle_time', 0.0)
+    rec['retrieved_chunks'] = trace['chunk_ids']
+    rec['retrieval_latency'] = trace['retrieval_time']
+    rec['fusion_latency'] = trace['fusion_time']
+    rec['generation_latency'] = trace['generation_time']
+    if 'retriever_times' in trace:
+        rec['retriever_latencies'] = trace['retriever_times']
+    return rec
+
+def run_get_responses_sim(client, kb_path, is_dir, dataset_file, sim_style="normal", retrieval="bm25",
+                          top_k=5, max_workers=1, hybrid_weights=(1.0, 1.0),
+                          context_tokens=DEFAULT_CONTEXT_TOKENS, progress_callback=None,
+                          output_dir="outputs/responses", resume=True, journal_dir=DEFAULT_JOURNAL_DIR,
+                          fmt=DEFAULT_FORMAT):
+    """
+    对测试集逐条模拟 RAG 回答 (流式读取测试集，按原顺序逐条写出)，返回 {"responses_file": 路径}
+    """
+    journal, done = open_journal("simulate", resume, journal_dir, os.path.abspath(dataset_file),
+                                 client.PROVIDER, client.default_model, sim_style, retrieval, top_k,
+                                 tuple(hybrid_weights), context_tokens)
+    simulator = build_simulator(client, kb_path, is_dir, sim_style, retrieval, top_k,
+                                hybrid_weights, context_tokens)
+
+    total = count_records(dataset_file)
+    print(f"开始模拟回答 (Provider={client.PROVIDER}, Model={client.default_model}, Style={sim_style}, Retrieval={retrieval}, Workers={max_workers})...")
+
+    def simulate_one(case):
+        # 运行日志中已完成的条目直接复用
+        rec = done.get(item_id(case))
+        if rec is None:
+            rec = simulate_case(simulator, case)
+            journal.append(item_id(case), rec)
+        return rec
+
+    failed = 0
+    output_file = output_path(output_dir, "rag_responses", fmt)
+    # tee 只缓存尚未产出结果的条目 (不超过 imap_ordered 的窗口)
+    cases, submitted = itertools.tee(iter_records(dataset_file))
+    with RecordWriter(output_file) as writer:
+        for i, (case, outcome) in enumerate(zip(cases, imap_ordered(simulate_one, submitted, max_workers))):
+            print(f"[{i+1}/{total}] Question: {case['question']}")
+            if progress_callback:
+                progress_callback(i + 1, total)
+            if isinstance(outcome, Exception):
+                print(f"Error simulating case {i+1}: {outcome}")
+                # Skip adding failed simulations to avoid error bars in report
+                failed += 1
+                continue
+            writer.write(outcome)
+
+    print(f"回答已保存至 {output_file}")
+    finish_journal(journal, failed == 0)
+    if client.cache is not None:
+        print(f"LLM 缓存统计: {client.cache.stats()}")
+    return {"responses_file": output_file}
+
+def build_evaluator(client, kb_path, is_dir, evidence_tokens=1000, kb=None):
+    # 评分证据按条目从知识库索引中检索，不再使用整段文本的固定前缀
+    if kb is None:
+        kb = load_knowledge_base(kb_path, is_dir, workers=os.cpu_count())
+    return Evaluator(client, kb=kb, retriever=BM25Retriever(kb), evidence_tokens=evidence_tokens)
+
+def score_item(evaluator, item, journal=None):
+    """
+    评分单条回答；失败时分数为空并在 error 字段记录原因，不计入平均分，也不影响其他条目。
+    成功的结果写入 journal，失败的条目不记录，续跑时会重新评分
+    """
+    try:
+        score = evaluator.evaluate(item)
+    except Exception as e:
+        print(f"Error scoring case: {e}")
+        score = Evaluator.failed_result(f"评分失败: {e}")
+        journal = None
+    rec = item.copy()
+    rec.update(score)
+    if journal is not None:
+        journal.append(item_id(item), rec)
+    return rec
+
+def results_path(output_dir, ts, results_format=DEFAULT_RESULTS_FORMAT):
+    """
+    评分结果默认写为 Parquet 列式存储；未安装 pyarrow 时退回 JSON Lines
+    """
+    if results_format == "parquet" and not parquet_available():
+        print("未安装 pyarrow，评分结果改为 JSON Lines 格式")
+        results_format = "jsonl"
+    return output_path(output_dir, "evaluation_results", results_format, ts)
+
+def write_report_outputs(results_file, output_dir, ts, excel=False, html=True):
+    """
+    由已写出的评分结果生成可选的 xlsx 与 HTML 报告，返回 HTML 报告路径 (未生成时为 None)
+    """
+    if excel:
+        print(f"已导出 Excel: {export_excel(results_file)}")
+    if not html:
+        return None
+    report_file = f"{output_dir}/evaluation_report_{ts}.html"
+    # matplotlib 只在生成报告时才导入，命令行模式下不需要图形界面
+    from src.utils.visualizer import generate_html_report
+    generate_html_report(load_results(results_file), report_file, ts)
+    return report_file
+
+def print_summary(results_file):
+    for row in summarize_results(results_file, by="type"):
+        scores = ", ".join(f"{c}={row[c]:.2f}" for c in SCORE_COLUMNS if row[c] is not None and row[c] == row[c])
+        failed = f" (评分失败 {row['failed']} 条，未计入平均分)" if row['failed'] else ""
+        print(f"  [{row['type']}] {row['count']} 条: {scores}{failed}")
+
+def run_scoring(client, kb_path, is_dir, responses_file, max_workers=1, evidence_tokens=1000,
+                progress_callback=None, output_dir="outputs/reports", excel=False, html=True,
+                resume=True, journal_dir=DEFAULT_JOURNAL_DIR, results_format=DEFAULT_RESULTS_FORMAT):
+    """
+    对回答集逐条评分 (流式读取，按原顺序逐条写出结果) 并生成报告，返回 {"results_file", "report_file"}
+    """
+    journal, done = open_journal("score", resume, journal_dir, os.path.abspath(responses_file),
+                                 client.PROVIDER, client.default_model, evidence_tokens)
+    evaluator = build_evaluator(client, kb_path, is_dir, evidence_tokens)
+
+    total = count_records(responses_file)
+    print(f"开始评分 (Provider={client.PROVIDER}, Model={client.default_model}, Workers={max_workers})...")
+
+    def score_one(item):
+        # 运行日志中已完成的条目直接复用
+        rec = done.get(item_id(item))
+        return rec if rec is not None else score_item(evaluator, item, journal)
+
+    ts = get_timestamp()
+    results_file = results_path(output_dir, ts, results_format)
+    scored = 0
+    with open_results_writer(results_file) as writer:
+        for i, rec in enumerate(imap_ordered(score_one, iter_records(responses_file), max_workers)):
+            print(f"[{i+1}/{total}] Scored: {rec['question']}")
+            if progress_callback:
+                progress_callback(i + 1, total)
+            if item_id(rec) not in done:
+                scored += 1
+            writer.write(rec)
+
+    print_summary(results_file)
+    report_file = write_report_outputs(results_file, output_dir, ts, excel, html)
+    outputs = {"results_file": results_file, "report_file": report_file}
+    # 评分失败的条目不写入运行日志
+    finish_journal(journal, journal.appended == scored)
+    print(f"评分完成，报告已生成: {outputs['report_file'] or outputs['results_file']}")
+    if client.cache is not None:
+        print(f"LLM 缓存统计: {client.cache.stats()}")
+    return outputs
+
+def run_streaming(client, kb_path, is_dir, config, sim_style="normal", retrieval="bm25", top_k=5,
+                  max_workers=1, hybrid_weights=(1.0, 1.0), context_tokens=DEFAULT_CONTEXT_TOKENS,
+                  evidence_tokens=1000, budget_tokens=None, queue_size=16, progress_callback=None,
+                  excel=False, html=True, fmt=DEFAULT_FORMAT, results_format=DEFAULT_RESULTS_FORMAT):
+    """
+    流水线模式：生成 -> 模拟 -> 评分 三个阶段同时运行，每条用例生成后立即进入模拟，
+    模拟完成后立即进入评分；阶段之间用容量为 queue_size 的有界队列连接 (下游慢时上游阻塞)。
+    总耗时接近最慢的阶段而不是三者之和。progress_callback(stage, done, total)。
+    测试集按生成顺序、回答集与评分结果按完成顺序逐条写出，返回三个阶段的输出文件。
+    """
+    count = config.get('count', 5)
+    doc_content = load_generation_context(client, kb_path, is_dir, config, budget_tokens)
+    simulator = build_simulator(client, kb_path, is_dir, sim_style, retrieval, top_k,
+                                hybrid_weights, context_tokens)
+    evaluator = build_evaluator(client, kb_path, is_dir, evidence_tokens,
+                                kb=None if retrieval == 'full' else simulator.knowledge_base)
+
+    cases_queue = queue.Queue(maxsize=queue_size)
+    responses_queue = queue.Queue(maxsize=queue_size)
+    results_queue = queue.Queue(maxsize=queue_size)
+    # 回答与评分结果按完成顺序写出 (不按生成顺序重排，避免慢条目阻塞已完成结果的写出)
+    state = {"simulated": 0, "error": None}
+    lock = threading.Lock()
+    ts = get_timestamp()
+    dataset_writer = RecordWriter(output_path("outputs/datasets", "test_dataset", fmt, ts))
+    responses_writer = RecordWriter(output_path("outputs/responses", "rag_responses", fmt, ts))
+    results_writer = open_results_writer(results_path("outputs/reports", ts, results_format))
+
+    def report(stage, done):
+        if progress_callback:
+            progress_callback(stage, done, count)
+
+    def on_case(item):
+        with lock:
+            dataset_writer.write(item)
+        cases_queue.put(item)
+
+    def generate():
+        try:
+            generate_test_cases(client, doc_content, config,
+                                lambda done, total: report("generate", done), on_case)
+        except Exception as e:
+            state["error"] = e
+        finally:
+            cases_queue.put(STREAM_END)
+
+    def simulate(case):
+        rec = simulate_case(simulator, case)
+        with lock:
+            state["simulated"] += 1
+            done = state["simulated"]
+        report("simulate", done)
+        return rec
+
+    def on_simulate_error(case, e):
+        print(f"Error simulating case '{case['question']}': {e}")
+
+    print(f"开始流水线运行 (Provider={client.PROVIDER}, Model={client.default_model}, Count={count}, Style={sim_style}, Retrieval={retrieval}, Workers={max_workers})...")
+    threading.Thread(target=generate, daemon=True).start()
+    start_stage(simulate, cases_queue, responses_queue, max_workers, on_simulate_error)
+    start_stage(lambda response: (response, score_item(evaluator, response)),
+                responses_queue, results_queue, max_workers)
+
+    scored = 0
+    try:
+        while True:
+            entry = results_queue.get()
+            if entry is STREAM_END:
+                break
+            response, result = entry
+            responses_writer.write(response)
+            results_writer.write(result)
+            scored += 1
+            report("score", scored)
+            print(f"[{scored}] Scored: {result['question']}")
+    finally:
+        for writer in (dataset_writer, responses_writer, results_writer):
+            writer.close()
+
+    if state["error"] is not None:
+        raise state["error"]
+
+    outputs = {
+        "dataset_file": dataset_writer.path,
+        "responses_file": responses_writer.path,
+        "results_file": results_writer.path,
+    }
+    print_summary(results_writer.path)
+    outputs["report_file"] = write_report_outputs(results_writer.path, "outputs/reports", ts, excel, html)
+    print(f"流水线完成，报告已生成: {outputs['report_file'] or outputs['results_file']}")
+    if client.cache is not None:
+        print(f"LLM 缓存统计: {client.cache.stats()}")
+    return outputs
@@ -0,0 +1,89 @@
+import os
+import time
+import threading
+from src.utils.tokens import get_token_estimator
+
+# 各提供商默认配额 (requests/min, tokens/min)，可用环境变量 RAG_RPM / RAG_TPM 覆盖
+DEFAULT_LIMITS = {
+    "deepseek": (600, 1000000),
+    "openai": (500, 300000),
+    "gemini": (15, 1000000),
+}
+
+class TokenBucket:
+    """
+    经典令牌桶：容量 capacity，每秒补充 rate 个令牌。
+    """
+
+    def __init__(self, capacity, rate):
+        self.capacity = float(capacity)
+        self.rate = float(rate)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount, now):
+        """
+        预扣 amount 个令牌，返回需要等待的秒数 (令牌可以被预扣为负数，后续请求会顺延)
+        """
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        self.tokens -= amount
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+class RateLimiter:
+    """
+    按 requests-per-minute 与 tokens-per-minute 两个令牌桶限流，线程安全。
+    acquire() 阻塞等待，返回等待的秒数。
+    """
+
+    def __init__(self, rpm=None, tpm=None):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._lock = threading.Lock()
+        self._request_bucket = TokenBucket(rpm, rpm / 60.0) if rpm else None
+        self._token_bucket = TokenBucket(tpm, tpm / 60.0) if tpm else None
+
+    def _reserve(self, tokens):
+        now = time.monotonic()
+        wait = 0.0
+        with self._lock:
+            if self._request_bucket:
+                wait = max(wait, self._request_bucket.reserve(1, now))
+            if self._token_bucket and tokens:
+                wait = max(wait, self._token_bucket.reserve(tokens, now))
+        return wait
+
+    def acquire(self, tokens=0):
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+def estimate_message_tokens(messages, provider="default"):
+    # 按提供商的离线估算参数计算 (中文与英文分别计权)
+    estimator = get_token_estimator(provider)
+    return sum(estimator.count(msg.get('content', '')) for msg in messages) + 1
+
+_LIMITERS = {}
+_LIMITERS_LOCK = threading.Lock()
+
+def get_rate_limiter(provider, model, rpm=None, tpm=None):
+    """
+    获取 (provider, model) 共享的限流器；同一进程内各阶段、各线程共用同一配额。
+    """
+    key = (provider, model)
+    with _LIMITERS_LOCK:
+        limiter = _LIMITERS.get(key)
+        if limiter is None:
+            default_rpm, default_tpm = DEFAULT_LIMITS.get(provider, (None, None))
+            rpm = rpm or int(os.environ.get("RAG_RPM", 0)) or default_rpm
+            tpm = tpm or int(os.environ.get("RAG_TPM", 0)) or default_tpm
+            limiter = RateLimiter(rpm, tpm)
+            _LIMITERS[key] = limiter
+        return limiter
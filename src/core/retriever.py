@@ -0,0 +1,117 @@
+import re
+import math
+import time
+import heapq
+from collections import Counter, defaultdict
+
+# 英文/数字按词切分，中日韩字符按单字 + 相邻二元组切分
+_LATIN_PATTERN = re.compile(r"[a-z0-9]+(?:[\.\-'][a-z0-9]+)*")
+_CJK_PATTERN = re.compile(r"[㐀-䶿一-鿿豈-﫿぀-ヿ가-힯]+")
+_TOKEN_PATTERN = re.compile(_LATIN_PATTERN.pattern + "|" + _CJK_PATTERN.pattern)
+
+def tokenize(text):
+    """
+    中英文混合分词：英文单词小写，中文连续片段展开为单字 + 二元组
+    """
+    tokens = []
+    for match in _TOKEN_PATTERN.finditer(text.lower()):
+        piece = match.group(0)
+        if _CJK_PATTERN.fullmatch(piece):
+            tokens.extend(piece)
+            tokens.extend(piece[i:i + 2] for i in range(len(piece) - 1))
+        else:
+            tokens.append(piece)
+    return tokens
+
+class BM25Retriever:
+    """
+    进程内 BM25 倒排索引，文档单位为 KnowledgeBase 的 chunk。
+    search() 返回 [(chunk_id, score)]，按得分降序。
+    """
+    name = "bm25"
+
+    def __init__(self, kb, k1=1.5, b=0.75):
+        self.kb = kb
+        self.k1 = k1
+        self.b = b
+        self.chunk_ids = []
+        self.doc_lengths = []
+        self.postings = defaultdict(list)
+        for chunk in kb.chunks:
+            self.add(chunk['id'], chunk['text'])
+        self._finalize()
+
+    def add(self, chunk_id, text):
+        doc_index = len(self.chunk_ids)
+        counts = Counter(tokenize(text))
+        self.chunk_ids.append(chunk_id)
+        self.doc_lengths.append(sum(counts.values()))
+        for term, tf in counts.items():
+            self.postings[term].append((doc_index, tf))
+
+    def _finalize(self):
+        n = len(self.chunk_ids)
+        self.avg_length = (sum(self.doc_lengths) / n) if n else 0.0
+        self.idf = {
+            term: math.log(1 + (n - len(plist) + 0.5) / (len(plist) + 0.5))
+            for term, plist in self.postings.items()
+        }
+
+    def search(self, query, top_k=5):
+        if not self.chunk_ids:
+            return []
+        scores = defaultdict(float)
+        avg_length = self.avg_length or 1.0
+        for term, qtf in Counter(tokenize(query)).items():
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = self.idf[term]
+            for doc_index, tf in plist:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_index] / avg_length)
+                scores[doc_index] += qtf * idf * tf * (self.k1 + 1) / (tf + norm)
+        best = heapq.nlargest(top_k, scores.items(), key=lambda kv: kv[1])
+        return [(self.chunk_ids[doc_index], score) for doc_index, score in best]
+
+class HybridRetriever:
+    """
+    混合检索：各子检索器分别取 candidates 个候选，再用加权倒数排名融合 (RRF)：
+    score(d) = sum_i w_i / (rrf_k + rank_i(d))
+    retrievers 为 [(retriever, weight)] 列表。
+    """
+    name = "hybrid"
+
+    def __init__(self, retrievers, rrf_k=60, candidates=20):
+        self.retrievers = retrievers
+        self.rrf_k = rrf_k
+        self.candidates = candidates
+
+    def search_with_timings(self, query, top_k=5):
+        """
+        返回 (hits, timings)，timings 包含各子检索器耗时、检索总耗时与融合耗时
+        """
+        ranked_lists = []
+        retriever_times = {}
+        for retriever, weight in self.retrievers:
+            start = time.perf_counter()
+            hits = retriever.search(query, max(top_k, self.candidates))
+            retriever_times[getattr(retriever, 'name', type(retriever).__name__)] = time.perf_counter() - start
+            ranked_lists.append((hits, weight))
+
+        start = time.perf_counter()
+        fused = defaultdict(float)
+        for hits, weight in ranked_lists:
+            for rank, (chunk_id, _) in enumerate(hits, start=1):
+                fused[chunk_id] += weight / (self.rrf_k + rank)
+        best = heapq.nlargest(top_k, fused.items(), key=lambda kv: kv[1])
+        fusion_time = time.perf_counter() - start
+
+        timings = {
+            "retrieval_time": sum(retriever_times.values()),
+            "fusion_time": fusion_time,
+            "retriever_times": retriever_times
+        }
+        return best, timings
+
+    def search(self, query, top_k=5):
+        return self.search_with_timings(query, top_k)[0]
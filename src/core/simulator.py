@@ -1,14 +1,58 @@
+import time
+from src.core.retriever import BM25Retriever
+from src.utils.tokens import get_token_estimator, DEFAULT_CONTEXT_TOKENS
+
 class AdvancedRAGSimulator:
-    def __init__(self, client, kb_content, style="normal"):
+    def __init__(self, client, kb_content, style="normal", retriever=None, top_k=5, context_tokens=DEFAULT_CONTEXT_TOKENS):
+        """
+        kb_content 可以是整段文本 (旧模式：截取 context_tokens 以内的前缀放入 prompt)，
+        也可以是 KnowledgeBase (检索模式：每个问题放入 top_k 个相关片段，总量不超过 context_tokens，默认 BM25)。
+        """
         self.client = client
         self.style = style
         self.knowledge_base = kb_content
+        self.top_k = top_k
+        self.context_tokens = context_tokens
+        self.estimator = get_token_estimator(getattr(client, 'PROVIDER', 'default'))
+        self.retriever = retriever
+        if retriever is None and hasattr(kb_content, 'chunks'):
+            self.retriever = BM25Retriever(kb_content)
 
-    def generate_response(self, question):
+    def retrieve(self, question):
+        """
+        返回 (context, chunk_ids, timings)，timings 至少包含 retrieval_time 与 fusion_time
+        """
+        if self.retriever is None:
+            context = self.estimator.truncate(self.knowledge_base, self.context_tokens)
+            if len(context) < len(self.knowledge_base):
+                context += "... (篇幅限制，截取部分)"
+            return context, [], {"retrieval_time": 0.0, "fusion_time": 0.0}
+        if hasattr(self.retriever, 'search_with_timings'):
+            hits, timings = self.retriever.search_with_timings(question, self.top_k)
+        else:
+            start = time.perf_counter()
+            hits = self.retriever.search(question, self.top_k)
+            timings = {"retrieval_time": time.perf_counter() - start, "fusion_time": 0.0}
+        # 按排名依次放入片段，直到用完 token 预算
+        chunk_ids = []
+        parts = []
+        used = 0
+        for chunk_id, _ in hits:
+            part = self.knowledge_base.format_chunks([chunk_id])
+            cost = self.estimator.count(part)
+            if used + cost > self.context_tokens:
+                break
+            chunk_ids.append(chunk_id)
+            parts.append(part)
+            used += cost
+        context = "\n\n".join(parts) or "(未检索到相关文档片段)"
+        return context, chunk_ids, timings
+
+    def _build_messages(self, question, context):
         system_prompt = f"""你是一个智能助手。请基于以下提供的[内部文档]来回答用户的问题。
 
 [内部文档开始]
-{self.knowledge_base[:100000]}... (篇幅限制，截取部分)
+{context}
 [内部文档结束]
 """
         
@@ -28,4 +72,25 @@ class AdvancedRAGSimulator:
         
         # 对抗模式下增加 temperature 以增加随机性
         temp = 0.7 if self.style != "normal" else 0.0
-        return self.client.chat(messages, temperature=temp)
+        return messages, temp
+
+    def generate_response_with_trace(self, question):
+        """
+        返回 {"answer", "chunk_ids", "retrieval_time", "fusion_time", "generation_time", "throttle_time", ...}，
+        各阶段分别计时；generation_time 不含在限流器中排队的时间 (单独记为 throttle_time)
+        """
+        context, chunk_ids, timings = self.retrieve(question)
+        messages, temp = self._build_messages(question, context)
+        pop_wait = getattr(self.client, 'pop_throttle_wait', lambda: 0.0)
+        pop_wait()
+        start = time.perf_counter()
+        answer = self.client.chat(messages, temperature=temp)
+        elapsed = time.perf_counter() - start
+        waited = pop_wait()
+        trace = {"answer": answer, "chunk_ids": chunk_ids, "generation_time": elapsed - waited,
+                 "throttle_time": waited}
+        trace.update(timings)
+        return trace
+
+    def generate_response(self, question):
+        return self.generate_response_with_trace(question)["answer"]
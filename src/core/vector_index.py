@@ -0,0 +1,159 @@
+import os
+import zlib
+import hashlib
+import numpy as np
+from src.core.retriever import tokenize
+
+DEFAULT_INDEX_DIR = "outputs/kb_index"
+
+class HashingEmbedder:
+    """
+    离线默认向量化器：分词结果 + 英文字符 n-gram 经 crc32 哈希到 dim 维，TF 取 log 后 L2 归一化。
+    不需要训练，跨进程结果稳定 (不依赖 Python 随机化的 hash())。
+    其他向量化器只需提供 name 属性与 embed(texts) -> float32 矩阵 即可替换。
+    """
+
+    def __init__(self, dim=512, ngram=3):
+        self.dim = dim
+        self.ngram = ngram
+        self.name = f"hash{dim}n{ngram}"
+
+    def _features(self, text):
+        for token in tokenize(text):
+            yield token
+            # 英文词额外加入字符 n-gram，缓解拼写变体/复合词
+            if len(token) > self.ngram and token.isascii():
+                padded = f"#{token}#"
+                for i in range(len(padded) - self.ngram + 1):
+                    yield padded[i:i + self.ngram]
+
+    def embed(self, texts):
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                h = zlib.crc32(feature.encode('utf-8'))
+                # 最高位决定符号，降低哈希碰撞带来的偏差
+                matrix[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (matrix / norms).astype(np.float32)
+
+def _text_hashes(chunks):
+    # 每个 chunk 文本的 64 位哈希：chunk id 在索引重建后会从 0 重新编号，复用向量时还需核对内容
+    return np.array([int.from_bytes(hashlib.blake2b(c['text'].encode('utf-8'), digest_size=8).digest(), 'little')
+                     for c in chunks], dtype=np.uint64)
+
+def _top_k(scores, k):
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.array([], dtype=np.int64)
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx])]
+
+class DenseRetriever:
+    """
+    基于 NumPy 的向量检索：
+    - 块数较少时精确暴力检索 (矩阵乘 + argpartition)
+    - 块数 >= ivf_threshold 时使用 IVF：k-means 聚类出 nlist 个中心，查询只扫描最近的 nprobe 个簇
+    search() 接口与 BM25Retriever 一致，返回 [(chunk_id, score)]。
+    """
+    name = "dense"
+
+    def __init__(self, kb, embedder=None, matrix=None, ivf_threshold=20000, nlist=None, nprobe=8):
+        self.kb = kb
+        self.embedder = embedder or HashingEmbedder()
+        self.chunk_ids = np.array([c['id'] for c in kb.chunks], dtype=np.int64)
+        if matrix is None:
+            matrix = self.embedder.embed([c['text'] for c in kb.chunks])
+        self.matrix = matrix
+        self.nprobe = nprobe
+        self.centroids = None
+        self.lists = None
+        if len(self.chunk_ids) >= ivf_threshold:
+            self._build_ivf(nlist or int(np.sqrt(len(self.chunk_ids))))
+
+    @classmethod
+    def load_or_build(cls, kb, embedder=None, index_dir=DEFAULT_INDEX_DIR, **kwargs):
+        """
+        向量矩阵以 float32 .npy 保存在磁盘上 (附带同序的 chunk id 与文本哈希数组)，按 memory-map 方式加载。
+        知识库增量更新后只为新出现或内容变化的 chunk 计算向量，id 与文本哈希都一致的 chunk 复用已有向量。
+        """
+        embedder = embedder or HashingEmbedder()
+        key = kb.name or kb.fingerprint
+        if not key:
+            return cls(kb, embedder, **kwargs)
+
+        os.makedirs(index_dir, exist_ok=True)
+        base = os.path.join(index_dir, f"dense_{key[:16]}_{embedder.name}")
+        matrix_path, ids_path, hashes_path = base + ".npy", base + ".ids.npy", base + ".hashes.npy"
+        chunk_ids = np.array([c['id'] for c in kb.chunks], dtype=np.int64)
+        hashes = _text_hashes(kb.chunks)
+
+        # 没有哈希文件的旧索引视为全部过期
+        saved = all(os.path.exists(p) for p in (matrix_path, ids_path, hashes_path))
+        old_ids = np.load(ids_path) if saved else None
+        old_hashes = np.load(hashes_path) if saved else None
+        if old_ids is None or not (np.array_equal(old_ids, chunk_ids) and np.array_equal(old_hashes, hashes)):
+            matrix = np.zeros((len(chunk_ids), embedder.dim), dtype=np.float32)
+            missing = np.ones(len(chunk_ids), dtype=bool)
+            if old_ids is not None and len(old_hashes) == len(old_ids):
+                old_matrix = np.load(matrix_path, mmap_mode='r')
+                if old_matrix.shape[1] == embedder.dim:
+                    old_rows = {(int(cid), int(h)): row for row, (cid, h) in enumerate(zip(old_ids, old_hashes))}
+                    for row, (cid, h) in enumerate(zip(chunk_ids, hashes)):
+                        old_row = old_rows.get((int(cid), int(h)))
+                        if old_row is not None:
+                            matrix[row] = old_matrix[old_row]
+                            missing[row] = False
+                del old_matrix
+            if missing.any():
+                texts = [kb.chunks[row]['text'] for row in np.flatnonzero(missing)]
+                matrix[missing] = embedder.embed(texts)
+            tmp_matrix, tmp_ids, tmp_hashes = base + ".tmp.npy", base + ".ids.tmp.npy", base + ".hashes.tmp.npy"
+            np.save(tmp_matrix, matrix)
+            np.save(tmp_ids, chunk_ids)
+            np.save(tmp_hashes, hashes)
+            os.replace(tmp_matrix, matrix_path)
+            os.replace(tmp_ids, ids_path)
+            os.replace(tmp_hashes, hashes_path)
+
+        return cls(kb, embedder, np.load(matrix_path, mmap_mode='r'), **kwargs)
+
+    def _build_ivf(self, nlist, iterations=10, sample_size=50000, seed=0):
+        rng = np.random.default_rng(seed)
+        n = len(self.chunk_ids)
+        nlist = max(1, min(nlist, n))
+        sample = self.matrix[rng.choice(n, size=min(n, sample_size), replace=False)]
+        centroids = np.array(sample[rng.choice(len(sample), size=nlist, replace=False)])
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[assign == c]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    norm = np.linalg.norm(centroid)
+                    centroids[c] = centroid / norm if norm else centroid
+        # 全量分配，分批避免一次性生成 n x nlist 的大矩阵
+        assign = np.empty(n, dtype=np.int64)
+        for start in range(0, n, 65536):
+            assign[start:start + 65536] = np.argmax(self.matrix[start:start + 65536] @ centroids.T, axis=1)
+        self.centroids = centroids.astype(np.float32)
+        self.lists = [np.flatnonzero(assign == c) for c in range(nlist)]
+
+    def search(self, query, top_k=5):
+        if len(self.chunk_ids) == 0:
+            return []
+        q = self.embedder.embed([query])[0]
+        if self.centroids is None:
+            scores = self.matrix @ q
+            best = _top_k(scores, top_k)
+            return [(int(self.chunk_ids[i]), float(scores[i])) for i in best]
+
+        probe = _top_k(self.centroids @ q, self.nprobe)
+        candidates = np.concatenate([self.lists[c] for c in probe])
+        if len(candidates) == 0:
+            return []
+        scores = self.matrix[candidates] @ q
+        best = _top_k(scores, top_k)
+        return [(int(self.chunk_ids[candidates[i]]), float(scores[i])) for i in best]
@@ -1,4 +1,5 @@
 import wx
+from src.utils.tokens import DEFAULT_CONTEXT_TOKENS
 
 class GenerationConfigDialog(wx.Dialog):
     def __init__(self, parent):
@@ -44,6 +45,14 @@ class GenerationConfigDialog(wx.Dialog):
         self.check_random = wx.CheckBox(self.scrolled_panel, label="随机截取长文档 (Random Sampling)")
         content_sizer.Add(self.check_random, 0, wx.ALL, 5)
         
+        content_sizer.Add(wx.StaticText(self.scrolled_panel, label="并行生成数 (1 为串行):"), 0, wx.ALL, 10)
+        self.spin_workers = wx.SpinCtrl(self.scrolled_panel, value="1", min=1, max=16)
+        content_sizer.Add(self.spin_workers, 0, wx.ALL | wx.EXPAND, 10)
+        
+        content_sizer.Add(wx.StaticText(self.scrolled_panel, label="每次调用生成数 (批量, 1 为逐条):"), 0, wx.ALL, 10)
+        self.spin_batch = wx.SpinCtrl(self.scrolled_panel, value="1", min=1, max=20)
+        content_sizer.Add(self.spin_batch, 0, wx.ALL | wx.EXPAND, 10)
+        
         self.scrolled_panel.SetSizer(content_sizer)
         
         main_sizer.Add(self.scrolled_panel, 1, wx.EXPAND | wx.ALL, 5)
@@ -66,12 +75,14 @@ class GenerationConfigDialog(wx.Dialog):
             "count": self.spin_count.GetValue(),
             "difficulty": self.choice_diff.GetStringSelection(),
             "focus": ", ".join(focus),
-            "random_sampling": self.check_random.GetValue()
+            "random_sampling": self.check_random.GetValue(),
+            "workers": self.spin_workers.GetValue(),
+            "batch_size": self.spin_batch.GetValue()
         }
 
 class SimulationConfigDialog(wx.Dialog):
     def __init__(self, parent):
-        wx.Dialog.__init__(self, parent, title="模拟回答风格配置", size=(400, 250))
+        wx.Dialog.__init__(self, parent, title="模拟回答风格配置", size=(480, 360))
         
         sizer = wx.BoxSizer(wx.VERTICAL)
         sizer.Add(wx.StaticText(self, label="选择模拟器的回答风格:"), 0, wx.ALL, 10)
@@ -86,6 +97,27 @@ class SimulationConfigDialog(wx.Dialog):
         sizer.Add(self.rb_verbose, 0, wx.ALL, 5)
         sizer.Add(self.rb_mixed, 0, wx.ALL, 5)
         
+        workers_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        workers_sizer.Add(wx.StaticText(self, label="最大并发请求数:"), 0, wx.CENTER | wx.ALL, 5)
+        self.spin_workers = wx.SpinCtrl(self, value="4", min=1, max=32)
+        workers_sizer.Add(self.spin_workers, 0, wx.ALL, 5)
+        sizer.Add(workers_sizer, 0, wx.ALL, 5)
+        
+        retrieval_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        retrieval_sizer.Add(wx.StaticText(self, label="检索模式:"), 0, wx.CENTER | wx.ALL, 5)
+        self.choice_retrieval = wx.Choice(self, choices=[
+            "BM25 检索 (Top-K 片段)",
+            "向量检索 (Dense)",
+            "混合检索 (BM25 + Dense, RRF)",
+            f"全文截取 (前 {DEFAULT_CONTEXT_TOKENS // 1000}k token)"
+        ])
+        self.choice_retrieval.SetSelection(0)
+        retrieval_sizer.Add(self.choice_retrieval, 0, wx.ALL, 5)
+        retrieval_sizer.Add(wx.StaticText(self, label="Top-K:"), 0, wx.CENTER | wx.ALL, 5)
+        self.spin_top_k = wx.SpinCtrl(self, value="5", min=1, max=50)
+        retrieval_sizer.Add(self.spin_top_k, 0, wx.ALL, 5)
+        sizer.Add(retrieval_sizer, 0, wx.ALL, 5)
+        
         btn_sizer = self.CreateButtonSizer(wx.OK | wx.CANCEL)
         sizer.Add(btn_sizer, 0, wx.ALIGN_CENTER | wx.ALL, 10)
         
@@ -96,3 +128,12 @@ class SimulationConfigDialog(wx.Dialog):
         if self.rb_verbose.GetValue(): return "verbose"
         if self.rb_mixed.GetValue(): return "mixed"
         return "normal"
+
+    def get_max_workers(self):
+        return self.spin_workers.GetValue()
+
+    def get_retrieval(self):
+        return ["bm25", "dense", "hybrid", "full"][self.choice_retrieval.GetSelection()]
+
+    def get_top_k(self):
+        return self.spin_top_k.GetValue()
@@ -1,24 +1,21 @@
 import wx
 import wx.html
 import os
-import json
 import threading
-import pandas as pd
-import time
 import webbrowser
-import datetime
 import sys
 
 from src.core.llm_client import LLMClientFactory
-from src.core.simulator import AdvancedRAGSimulator
-from src.core.evaluator import Evaluator
-from src.core.generator import generate_test_cases
+from src.core.llm_cache import get_default_cache
+from src.core import pipeline
 from src.utils.logger import set_debug_ctrl, RedirectText
-from src.utils.file_loader import read_knowledge_base
-from src.utils.visualizer import generate_html_report
+from src.utils.records import convert_records
+from src.utils.results_store import export_excel
 from src.gui.dialogs import GenerationConfigDialog, SimulationConfigDialog
 from src.gui.viewer import DatasetViewerFrame
 
+RECORD_WILDCARD = "JSON Lines (*.jsonl)|*.jsonl|JSON files (*.json)|*.json"
+
 class WorkerThread(threading.Thread):
     def __init__(self, notify_window, task_type, **kwargs):
         threading.Thread.__init__(self)
@@ -41,151 +38,62 @@ class WorkerThread(threading.Thread):
         except Exception as e:
             wx.CallAfter(self.notify_window.on_task_done, self.task_type, False, str(e), None)
 
-    def get_timestamp(self):
-        return datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-
-    def run_generate_cases(self):
+    def create_client(self):
         provider = self.kwargs.get('provider')
         api_key = self.kwargs.get('api_key')
         model = self.kwargs.get('model')
-        
-        client = LLMClientFactory.create_client(provider, api_key, model)
-        
-        kb_path = self.kwargs.get('kb_path')
-        is_dir = self.kwargs.get('is_dir', False)
-        config = self.kwargs.get('config', {})
-        
-        # 如果启用了随机采样，同时打乱文件读取顺序，保证多文档时的随机性
-        shuffle_files = config.get('random_sampling', False)
-        doc_content = read_knowledge_base(kb_path, is_dir, shuffle_files=shuffle_files)
-        if not doc_content: raise Exception("知识库为空")
-        
-        print(f"正在生成测试集 (Provider={provider}, Model={model}, Count={config.get('count')})...")
-        
-        # 定义进度回调
-        def progress_callback(current, total):
-            wx.CallAfter(self.notify_window.update_progress, f"正在生成 ({current}/{total})...")
-            
-        test_cases = generate_test_cases(client, doc_content, config, progress_callback)
-        
-        # 确保目录存在
-        output_dir = "outputs/datasets"
-        os.makedirs(output_dir, exist_ok=True)
-        
-        ts = self.get_timestamp()
-        output_file = f"{output_dir}/test_dataset_{ts}.json"
-        
-        with open(output_file, "w", encoding='utf-8') as f:
-            json.dump(test_cases, f, ensure_ascii=False, indent=2)
-            
-        print(f"测试集已保存至 {output_file}")
-        return {"dataset_file": output_file}
+        workers = self.kwargs.get('max_workers') or self.kwargs.get('config', {}).get('workers', 1)
+        return LLMClientFactory.create_client(provider, api_key, model, cache=get_default_cache(), workers=workers)
+
+    def progress(self, label):
+        # 将阶段进度转发到界面线程
+        def progress_callback(done, total):
+            wx.CallAfter(self.notify_window.update_progress, f"{label} ({done}/{total})...")
+        return progress_callback
+
+    def run_generate_cases(self):
+        return pipeline.run_generate_cases(
+            self.create_client(),
+            self.kwargs.get('kb_path'),
+            self.kwargs.get('is_dir', False),
+            self.kwargs.get('config', {}),
+            progress_callback=self.progress("正在生成"),
+            resume=self.kwargs.get('resume', True)
+        )
 
     def run_get_responses_sim(self):
-        provider = self.kwargs.get('provider')
-        api_key = self.kwargs.get('api_key')
-        model = self.kwargs.get('model')
-        
-        client = LLMClientFactory.create_client(provider, api_key, model)
-        
-        kb_path = self.kwargs.get('kb_path')
-        is_dir = self.kwargs.get('is_dir', False)
-        dataset_file = self.kwargs.get('dataset_file')
-        sim_style = self.kwargs.get('sim_style', 'normal')
-        
-        doc_content = read_knowledge_base(kb_path, is_dir)
-        
-        with open(dataset_file, 'r', encoding='utf-8') as f:
-            test_cases = json.load(f)
-            
-        simulator = AdvancedRAGSimulator(client, doc_content, style=sim_style)
-        responses = []
-        total = len(test_cases)
-        
-        print(f"开始模拟回答 (Provider={provider}, Model={model}, Style={sim_style})...")
-        for i, case in enumerate(test_cases):
-            msg = f"[{i+1}/{total}] Question: {case['question']}"
-            print(msg)
-            wx.CallAfter(self.notify_window.update_progress, f"正在模拟 ({i+1}/{total})...")
-            
-            rec = case.copy()
-            rec['sim_style'] = sim_style
-            
-            try:
-                start = time.time()
-                ans = simulator.generate_response(case['question'])
-                latency = time.time() - start
-                
-                rec['rag_answer'] = ans
-                rec['latency'] = latency
-                responses.append(rec)
-            except Exception as e:
-                print(f"Error simulating case {i+1}: {e}")
-                # Skip adding failed simulations to avoid error bars in report
-                continue
-            
-        # 确保目录存在
-        output_dir = "outputs/responses"
-        os.makedirs(output_dir, exist_ok=True)
-        
-        ts = self.get_timestamp()
-        output_file = f"{output_dir}/rag_responses_{ts}.json"
-        
-        with open(output_file, "w", encoding='utf-8') as f:
-            json.dump(responses, f, ensure_ascii=False, indent=2)
-            
-        print(f"回答已保存至 {output_file}")
-        return {"responses_file": output_file}
+        return pipeline.run_get_responses_sim(
+            self.create_client(),
+            self.kwargs.get('kb_path'),
+            self.kwargs.get('is_dir', False),
+            self.kwargs.get('dataset_file'),
+            sim_style=self.kwargs.get('sim_style', 'normal'),
+            retrieval=self.kwargs.get('retrieval', 'bm25'),
+            top_k=self.kwargs.get('top_k', 5),
+            max_workers=self.kwargs.get('max_workers', 1),
+            hybrid_weights=self.kwargs.get('hybrid_weights', (1.0, 1.0)),
+            progress_callback=self.progress("正在模拟"),
+            resume=self.kwargs.get('resume', True)
+        )
 
     def run_scoring(self):
-        provider = self.kwargs.get('provider')
-        api_key = self.kwargs.get('api_key')
-        model = self.kwargs.get('model')
-        
-        client = LLMClientFactory.create_client(provider, api_key, model)
-        
-        kb_path = self.kwargs.get('kb_path')
-        is_dir = self.kwargs.get('is_dir', False)
-        responses_file = self.kwargs.get('responses_file')
-        
-        doc_content = read_knowledge_base(kb_path, is_dir)
-        with open(responses_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            
-        evaluator = Evaluator(client)
-        results = []
-        total = len(data)
-        
-        print(f"开始评分 (Provider={provider}, Model={model})...")
-        for i, item in enumerate(data):
-            print(f"[{i+1}/{total}] Scoring: {item['question']}")
-            score = evaluator.evaluate(item, doc_content)
-            rec = item.copy()
-            rec.update(score)
-            results.append(rec)
-            
-        # 确保目录存在
-        output_dir = "outputs/reports"
-        os.makedirs(output_dir, exist_ok=True)
-        
-        ts = self.get_timestamp()
-        json_file = f"{output_dir}/evaluation_results_{ts}.json"
-        excel_file = f"{output_dir}/evaluation_results_{ts}.xlsx"
-        report_file = f"{output_dir}/evaluation_report_{ts}.html"
-        
-        df = pd.DataFrame(results)
-        df.to_json(json_file, orient="records", force_ascii=False, indent=2)
-        df.to_excel(excel_file, index=False)
-        generate_html_report(df, report_file, ts)
-        
-        print(f"评分完成，报告已生成: {report_file}")
-        return {"report_file": report_file}
+        return pipeline.run_scoring(
+            self.create_client(),
+            self.kwargs.get('kb_path'),
+            self.kwargs.get('is_dir', False),
+            self.kwargs.get('responses_file'),
+            max_workers=self.kwargs.get('max_workers', 1),
+            evidence_tokens=self.kwargs.get('evidence_tokens', 1000),
+            progress_callback=self.progress("正在评分"),
+            resume=self.kwargs.get('resume', True)
+        )
 
 class GeneratorPanel(wx.Panel):
-    def __init__(self, parent, get_kb_config, get_llm_config):
+    def __init__(self, parent, get_kb_config, get_llm_config, get_resume):
         wx.Panel.__init__(self, parent)
         self.get_kb_config = get_kb_config
         self.get_llm_config = get_llm_config
+        self.get_resume = get_resume
         self.current_dataset_file = None
         
         sizer = wx.BoxSizer(wx.VERTICAL)
@@ -236,7 +144,7 @@ class GeneratorPanel(wx.Panel):
             
             # Start Worker Thread
             WorkerThread(self, "generate_cases", kb_path=path, is_dir=is_dir, config=cfg,
-                         provider=provider, api_key=api_key, model=model)
+                         provider=provider, api_key=api_key, model=model, resume=self.get_resume())
         dlg.Destroy()
 
     def on_view(self, evt):
@@ -246,13 +154,13 @@ class GeneratorPanel(wx.Panel):
     def on_export(self, evt):
         if not self.current_dataset_file: return
         
-        dlg = wx.FileDialog(self, "导出测试集", wildcard="JSON files (*.json)|*.json",
+        dlg = wx.FileDialog(self, "导出测试集", wildcard=RECORD_WILDCARD,
                            style=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT)
         if dlg.ShowModal() == wx.ID_OK:
             path = dlg.GetPath()
             try:
-                import shutil
-                shutil.copy2(self.current_dataset_file, path)
+                # 按所选扩展名转换格式 (.jsonl / .json)
+                convert_records(self.current_dataset_file, path)
                 wx.MessageBox(f"导出成功: {path}", "成功")
             except Exception as e:
                 wx.MessageBox(f"导出失败: {e}", "错误")
@@ -270,10 +178,11 @@ class GeneratorPanel(wx.Panel):
             wx.MessageBox(msg, "Error", wx.ICON_ERROR)
 
 class SimulatorPanel(wx.Panel):
-    def __init__(self, parent, get_kb_config, get_llm_config):
+    def __init__(self, parent, get_kb_config, get_llm_config, get_resume):
         wx.Panel.__init__(self, parent)
         self.get_kb_config = get_kb_config
         self.get_llm_config = get_llm_config
+        self.get_resume = get_resume
         self.dataset_file = None
         self.current_responses_file = None
         
@@ -283,7 +192,7 @@ class SimulatorPanel(wx.Panel):
         input_box = wx.StaticBox(self, label="1. 输入: 测试用例集")
         input_sizer = wx.StaticBoxSizer(input_box, wx.HORIZONTAL)
         
-        self.dataset_picker = wx.FilePickerCtrl(self, message="选择测试集JSON", wildcard="JSON|*.json")
+        self.dataset_picker = wx.FilePickerCtrl(self, message="选择测试集 (JSONL/JSON)", wildcard=RECORD_WILDCARD)
         input_sizer.Add(wx.StaticText(self, label="文件:"), 0, wx.CENTER|wx.ALL, 5)
         input_sizer.Add(self.dataset_picker, 1, wx.EXPAND|wx.ALL, 5)
         
@@ -332,18 +241,21 @@ class SimulatorPanel(wx.Panel):
             self.info_txt.SetLabel(f"正在模拟 ({style})...")
             WorkerThread(self, "get_responses_sim", kb_path=path, is_dir=is_dir, 
                          dataset_file=dataset_file, sim_style=style,
-                         provider=provider, api_key=api_key, model=model)
+                         provider=provider, api_key=api_key, model=model,
+                         max_workers=dlg.get_max_workers(),
+                         retrieval=dlg.get_retrieval(), top_k=dlg.get_top_k(),
+                         resume=self.get_resume())
         dlg.Destroy()
 
     def on_export(self, evt):
         if not self.current_responses_file: return
-        dlg = wx.FileDialog(self, "导出回答", wildcard="JSON files (*.json)|*.json",
+        dlg = wx.FileDialog(self, "导出回答", wildcard=RECORD_WILDCARD,
                            style=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT)
         if dlg.ShowModal() == wx.ID_OK:
             path = dlg.GetPath()
             try:
-                import shutil
-                shutil.copy2(self.current_responses_file, path)
+                # 按所选扩展名转换格式 (.jsonl / .json)
+                convert_records(self.current_responses_file, path)
                 wx.MessageBox(f"导出成功: {path}", "成功")
             except Exception as e:
                 wx.MessageBox(f"导出失败: {e}", "错误")
@@ -360,11 +272,13 @@ class SimulatorPanel(wx.Panel):
             wx.MessageBox(msg, "Error", wx.ICON_ERROR)
 
 class EvaluatorPanel(wx.Panel):
-    def __init__(self, parent, get_kb_config, get_llm_config):
+    def __init__(self, parent, get_kb_config, get_llm_config, get_resume):
         wx.Panel.__init__(self, parent)
         self.get_kb_config = get_kb_config
         self.get_llm_config = get_llm_config
+        self.get_resume = get_resume
         self.current_report_file = None
+        self.current_results_file = None
         
         sizer = wx.BoxSizer(wx.VERTICAL)
         
@@ -372,7 +286,7 @@ class EvaluatorPanel(wx.Panel):
         input_box = wx.StaticBox(self, label="1. 输入: 回答结果")
         input_sizer = wx.StaticBoxSizer(input_box, wx.HORIZONTAL)
         
-        self.resp_picker = wx.FilePickerCtrl(self, message="选择回答集JSON", wildcard="JSON|*.json")
+        self.resp_picker = wx.FilePickerCtrl(self, message="选择回答集 (JSONL/JSON)", wildcard=RECORD_WILDCARD)
         input_sizer.Add(wx.StaticText(self, label="文件:"), 0, wx.CENTER|wx.ALL, 5)
         input_sizer.Add(self.resp_picker, 1, wx.EXPAND|wx.ALL, 5)
         
@@ -385,9 +299,15 @@ class EvaluatorPanel(wx.Panel):
         self.btn_score = wx.Button(self, label="开始评分 (AI)")
         self.btn_rpt = wx.Button(self, label="打开报告")
         self.btn_rpt.Disable()
+        self.btn_excel = wx.Button(self, label="导出 Excel")
+        self.btn_excel.Disable()
+        self.spin_workers = wx.SpinCtrl(self, value="4", min=1, max=32, size=(60, -1))
         
         act_sizer.Add(self.btn_score, 0, wx.ALL, 5)
         act_sizer.Add(self.btn_rpt, 0, wx.ALL, 5)
+        act_sizer.Add(self.btn_excel, 0, wx.ALL, 5)
+        act_sizer.Add(wx.StaticText(self, label="并发数:"), 0, wx.CENTER|wx.ALL, 5)
+        act_sizer.Add(self.spin_workers, 0, wx.ALL, 5)
         
         sizer.Add(act_sizer, 0, wx.EXPAND|wx.ALL, 10)
         
@@ -399,6 +319,10 @@ class EvaluatorPanel(wx.Panel):
         
         self.btn_score.Bind(wx.EVT_BUTTON, self.on_score)
         self.btn_rpt.Bind(wx.EVT_BUTTON, self.on_rpt)
+        self.btn_excel.Bind(wx.EVT_BUTTON, self.on_excel)
+
+    def update_progress(self, msg):
+        self.info_txt.SetLabel(msg)
 
     def on_score(self, evt):
         resp_file = self.resp_picker.GetPath()
@@ -415,17 +339,34 @@ class EvaluatorPanel(wx.Panel):
         self.btn_score.Disable()
         self.info_txt.SetLabel("正在评分...")
         WorkerThread(self, "run_scoring", kb_path=path, is_dir=is_dir, responses_file=resp_file,
-                     provider=provider, api_key=api_key, model=model)
+                     provider=provider, api_key=api_key, model=model,
+                     max_workers=self.spin_workers.GetValue(), resume=self.get_resume())
 
     def on_rpt(self, evt):
         if self.current_report_file:
             webbrowser.open(f"file:///{os.path.abspath(self.current_report_file)}")
 
+    def on_excel(self, evt):
+        if not self.current_results_file: return
+        dlg = wx.FileDialog(self, "导出 Excel", wildcard="Excel files (*.xlsx)|*.xlsx",
+                           style=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT)
+        if dlg.ShowModal() == wx.ID_OK:
+            path = dlg.GetPath()
+            try:
+                # 评分结果以 Parquet 保存，xlsx 只在需要时生成
+                export_excel(self.current_results_file, path)
+                wx.MessageBox(f"导出成功: {path}", "成功")
+            except Exception as e:
+                wx.MessageBox(f"导出失败: {e}", "错误")
+        dlg.Destroy()
+
     def on_task_done(self, task, success, msg, res):
         self.btn_score.Enable()
         if success:
             self.current_report_file = res['report_file']
+            self.current_results_file = res['results_file']
             self.btn_rpt.Enable()
+            self.btn_excel.Enable()
             self.info_txt.SetLabel(f"评分完成，报告已生成")
             wx.MessageBox("评分完成！", "Success")
         else:
@@ -458,7 +399,11 @@ class MainFrame(wx.Frame):
         top_bar = wx.BoxSizer(wx.HORIZONTAL)
         self.chk_debug = wx.CheckBox(self.main_panel, label="显示调试日志")
         self.chk_debug.Bind(wx.EVT_CHECKBOX, self.on_toggle_debug)
+        # 断点续跑：复用相同输入与参数下未完成的运行日志；取消勾选则丢弃旧日志从头开始
+        self.chk_resume = wx.CheckBox(self.main_panel, label="断点续跑")
+        self.chk_resume.SetValue(True)
         top_bar.Add(wx.StaticText(self.main_panel, label="RAG 测试工作台"), 1, wx.ALIGN_CENTER_VERTICAL|wx.ALL, 10)
+        top_bar.Add(self.chk_resume, 0, wx.ALIGN_CENTER_VERTICAL|wx.ALL, 10)
         top_bar.Add(self.chk_debug, 0, wx.ALIGN_CENTER_VERTICAL|wx.ALL, 10)
         main_sizer.Add(top_bar, 0, wx.EXPAND)
         main_sizer.Add(wx.StaticLine(self.main_panel), 0, wx.EXPAND)
@@ -515,9 +460,9 @@ class MainFrame(wx.Frame):
         # 2. Tabs (Modular Workflow)
         self.notebook = wx.Notebook(self.main_panel)
         
-        self.tab_gen = GeneratorPanel(self.notebook, self.get_config, self.get_llm_config)
-        self.tab_sim = SimulatorPanel(self.notebook, self.get_config, self.get_llm_config)
-        self.tab_eval = EvaluatorPanel(self.notebook, self.get_config, self.get_llm_config)
+        self.tab_gen = GeneratorPanel(self.notebook, self.get_config, self.get_llm_config, self.get_resume)
+        self.tab_sim = SimulatorPanel(self.notebook, self.get_config, self.get_llm_config, self.get_resume)
+        self.tab_eval = EvaluatorPanel(self.notebook, self.get_config, self.get_llm_config, self.get_resume)
         
         self.notebook.AddPage(self.tab_gen, "1. 生成测试集")
         self.notebook.AddPage(self.tab_sim, "2. 模拟回答")
@@ -594,6 +539,9 @@ class MainFrame(wx.Frame):
             
         return provider, model, api_key, None
 
+    def get_resume(self):
+        return self.chk_resume.GetValue()
+
     def get_config(self):
         if self.rb_folder.GetValue():
             path = self.dir_picker.GetPath()
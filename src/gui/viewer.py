@@ -1,8 +1,8 @@
 import wx
 import wx.grid
-import json
 import os
 import pandas as pd
+from src.utils.records import read_records
 
 class DatasetViewerFrame(wx.Frame):
     def __init__(self, parent, dataset_file):
@@ -41,8 +41,7 @@ class DatasetViewerFrame(wx.Frame):
 
     def load_data(self):
         try:
-            with open(self.dataset_file, 'r', encoding='utf-8') as f:
-                self.data = json.load(f)
+            self.data = read_records(self.dataset_file)
             
             if self.grid.GetNumberRows() > 0:
                 self.grid.DeleteRows(0, self.grid.GetNumberRows())
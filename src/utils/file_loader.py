@@ -1,16 +1,130 @@
 import os
-import pandas as pd
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import openpyxl
 import docx
 import random
 from pypdf import PdfReader
+from src.utils.parse_cache import get_default_parse_cache
+from src.utils.tokens import get_token_estimator
 
-def read_file_content(file_path):
+def iter_pdf_pages(file_path, start_page=0, end_page=None):
     """
-    读取不同格式的文件内容 (.txt, .md, .json, .docx, .pdf, .xlsx)
+    按页惰性抽取 PDF 文本，产出 (page_index, text)，调用方停止迭代后剩余页面不再解析。
+    只解析 [start_page, end_page) 范围内的页面，可按分块记录的页码范围 (page_start/page_end) 重新抽取对应页面。
     """
-    if not os.path.exists(file_path):
+    return _iter_reader_pages(PdfReader(file_path), start_page, end_page)
+
+def _page_range(reader, start_page, end_page):
+    total = len(reader.pages)
+    return max(0, start_page), total if end_page is None else min(end_page, total)
+
+def _iter_reader_pages(reader, start_page, end_page):
+    start_page, end_page = _page_range(reader, start_page, end_page)
+    for page_index in range(start_page, end_page):
+        text = reader.pages[page_index].extract_text()
+        if text:
+            yield page_index, text
+
+def extract_pdf_text(file_path, max_chars=None, start_page=0, end_page=None):
+    """
+    拼接 PDF 页面文本；累计长度达到 max_chars 后停止解析后续页面。
+    返回 (text, page_starts, complete)：page_starts 为 [(page_index, 该页在 text 中的起始偏移)]，
+    complete 表示范围内的页面都已读完 (没有因预算提前停止)
+    """
+    reader = PdfReader(file_path)
+    last_page = _page_range(reader, start_page, end_page)[1] - 1
+    parts = []
+    page_starts = []
+    total = 0
+    complete = True
+    for page_index, text in _iter_reader_pages(reader, start_page, end_page):
+        page_starts.append((page_index, total))
+        parts.append(text + "\n")
+        total += len(text) + 1
+        if max_chars is not None and total >= max_chars:
+            complete = page_index >= last_page
+            break
+    return "".join(parts), page_starts, complete
+
+def read_pdf_text(file_path, max_chars=None, start_page=0, end_page=None):
+    return extract_pdf_text(file_path, max_chars, start_page, end_page)[0]
+
+def _format_cell(value):
+    if value is None:
         return ""
-        
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+def iter_xlsx_rows(file_path):
+    """
+    以只读流式方式遍历 .xlsx 的所有工作表，产出 (sheet_name, row_number, text)。
+    每个工作表第一行非空行视为表头，其余行输出为紧凑的 "表头: 值; 表头: 值" 文本，空单元格省略。
+    """
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            header = None
+            for row_number, row in enumerate(sheet.iter_rows(values_only=True), start=1):
+                cells = [_format_cell(v) for v in row]
+                if not any(cells):
+                    continue
+                if header is None:
+                    header = [c or f"列{i+1}" for i, c in enumerate(cells)]
+                    continue
+                pairs = []
+                for i, value in enumerate(cells):
+                    if value:
+                        name = header[i] if i < len(header) else f"列{i+1}"
+                        pairs.append(f"{name}: {value}")
+                yield sheet.title, row_number, "; ".join(pairs)
+    finally:
+        workbook.close()
+
+def extract_xlsx_text(file_path, max_chars=None):
+    """
+    每个工作表以 "## 工作表: 名称" 标题开头，后面每行一条记录，
+    分块时按行对齐，得到按行区间划分的块；累计长度达到 max_chars 后停止读取。
+    返回 (text, complete)，complete 表示所有行都已读完
+    """
+    parts = []
+    total = 0
+    current_sheet = None
+    complete = True
+    rows = iter_xlsx_rows(file_path)
+    try:
+        for sheet_name, _, text in rows:
+            if sheet_name != current_sheet:
+                current_sheet = sheet_name
+                parts.append(f"## 工作表: {sheet_name}\n")
+            parts.append(text + "\n")
+            total += len(text) + 1
+            if max_chars is not None and total >= max_chars:
+                # 预算恰好在最后一行用完时仍算读完
+                complete = next(rows, None) is None
+                break
+    finally:
+        rows.close()
+    return "".join(parts), complete
+
+def read_xlsx_text(file_path, max_chars=None):
+    return extract_xlsx_text(file_path, max_chars)[0]
+
+def is_parse_failure(content):
+    # 解析出错时 read_file_content 返回 "[读取失败: ...]" 占位文本，不应被缓存或建入索引
+    return content.startswith("[读取失败")
+
+def extract_file_content(file_path, max_chars=None):
+    """
+    读取不同格式的文件内容 (.txt, .md, .json, .docx, .pdf, .xlsx)，返回 (content, info)。
+    max_chars 为调用方的字符预算，PDF/xlsx 达到预算后不再解析剩余页面/行 (返回内容可能略超预算，由调用方截断)。
+    info["complete"] 为 False 表示因预算提前停止 (部分文本不应写入缓存)；PDF 另有 info["page_starts"]
+    """
+    info = {"complete": True}
+    if not os.path.exists(file_path):
+        return "", info
+
     ext = os.path.splitext(file_path)[1].lower()
     content = ""
     try:
@@ -21,95 +135,200 @@ def read_file_content(file_path):
             doc = docx.Document(file_path)
             content = "\n".join([para.text for para in doc.paragraphs])
         elif ext == '.pdf':
-            reader = PdfReader(file_path)
-            for page in reader.pages:
-                text = page.extract_text()
-                if text:
-                    content += text + "\n"
+            content, page_starts, info["complete"] = extract_pdf_text(file_path, max_chars)
+            info["page_starts"] = page_starts
         elif ext == '.xlsx':
-            df = pd.read_excel(file_path)
-            content = df.to_string(index=False)
+            content, info["complete"] = extract_xlsx_text(file_path, max_chars)
     except Exception as e:
         print(f"解析文件 {file_path} 时出错: {e}")
-        return f"[读取失败: {str(e)}]"
-    
+        return f"[读取失败: {str(e)}]", info
+
+    return content, info
+
+def read_file_content(file_path, max_chars=None):
+    return extract_file_content(file_path, max_chars)[0]
+
+def _cache_metadata(file_path, content, info, parse_time):
+    metadata = {
+        "ext": os.path.splitext(file_path)[1].lower(),
+        "chars": len(content),
+        "parse_time": parse_time,
+        "parsed_at": time.time()
+    }
+    if "page_starts" in info:
+        metadata["page_starts"] = info["page_starts"]
+    return metadata
+
+def _cacheable(content, info):
+    # 解析失败或因预算提前停止的结果不缓存，下次重新解析
+    return bool(content) and not is_parse_failure(content) and info.get("complete", True)
+
+def read_file_content_cached(file_path, cache=None):
+    """
+    带解析缓存的 read_file_content：文件未变化时直接返回上次抽取的文本
+    """
+    if not os.path.exists(file_path):
+        return ""
+    if cache is None:
+        cache = get_default_parse_cache()
+
+    entry = cache.get(file_path)
+    if entry is not None:
+        return entry['text']
+
+    start = time.time()
+    content, info = extract_file_content(file_path)
+    if _cacheable(content, info):
+        cache.put(file_path, content, _cache_metadata(file_path, content, info, time.time() - start))
     return content
 
-def read_knowledge_base(kb_path, is_dir, shuffle_files=False):
+SUPPORTED_EXTENSIONS = ('.txt', '.md', '.json', '.docx', '.pdf', '.xlsx')
+
+def list_knowledge_files(kb_path):
+    """
+    递归列出文件夹下所有支持格式的文件 (按路径排序)
+    """
+    file_list = []
+    for root, dirs, files in os.walk(kb_path):
+        for file in files:
+            if file.lower().endswith(SUPPORTED_EXTENSIONS):
+                file_list.append(os.path.join(root, file))
+    file_list.sort()
+    return file_list
+
+def _parse_in_worker(file_path, max_chars=None):
+    # 子进程入口：返回解析耗时以便主进程写入缓存元数据
+    start = time.time()
+    content, info = extract_file_content(file_path, max_chars)
+    return content, info, time.time() - start
+
+def _cached_entry(cache, file_path):
+    if cache is None or not os.path.exists(file_path):
+        return None
+    entry = cache.get(file_path)
+    # 早期缓存的 PDF 没有页码偏移，重新解析一次以便分块记录页码范围
+    if entry is not None and file_path.lower().endswith('.pdf') and 'page_starts' not in entry.get('metadata', {}):
+        return None
+    return entry
+
+def iter_parsed_files(file_list, workers=None, use_cache=True, max_chars=None, with_info=False):
+    """
+    解析一组文件，按完成顺序逐个产出 (file_path, content)；with_info=True 时产出 (file_path, content, info)，
+    info 中 PDF 的 page_starts 为各页在 content 中的起始偏移。
+    缓存命中的文件在主进程直接返回；其余文件交给进程池并行解析 (PDF/docx 解析受 GIL 限制，线程无法加速)，
+    解析结果由主进程写回缓存。workers <= 1 或待解析文件少于 2 个时在当前进程内顺序解析。
+    max_chars 为单个文件的字符预算：未命中缓存的 PDF/xlsx 解析到该长度即停止，实际提前停止时得到的部分文本不写入缓存
+    (缓存命中时仍返回完整文本，由调用方截断)。
+    """
+    cache = get_default_parse_cache() if use_cache else None
+
+    def result(file_path, content, info):
+        return (file_path, content, info) if with_info else (file_path, content)
+
+    def finish(file_path, content, info, parse_time):
+        if cache is not None and _cacheable(content, info):
+            cache.put(file_path, content, _cache_metadata(file_path, content, info, parse_time))
+        return result(file_path, content, info)
+
+    pending = []
+    for file_path in file_list:
+        entry = _cached_entry(cache, file_path)
+        if entry is not None:
+            yield result(file_path, entry['text'], dict(entry.get('metadata', {}), complete=True))
+        else:
+            pending.append(file_path)
+
+    workers = workers or 1
+    if workers <= 1 or len(pending) < 2:
+        for file_path in pending:
+            yield finish(file_path, *_parse_in_worker(file_path, max_chars))
+        return
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+        futures = {pool.submit(_parse_in_worker, file_path, max_chars): file_path for file_path in pending}
+        for future in as_completed(futures):
+            file_path = futures[future]
+            try:
+                content, info, parse_time = future.result()
+            except Exception as e:
+                print(f"解析文件 {file_path} 时出错: {e}")
+                content, info, parse_time = f"[读取失败: {str(e)}]", {"complete": True}, 0.0
+            yield finish(file_path, content, info, parse_time)
+
+DEFAULT_BUDGET_CHARS = 500000
+
+def allocate_budget(lengths, budget):
     """
-    读取知识库（单文件或文件夹）
+    注水式 (water-filling) 配额分配：短文件全部纳入，剩余预算在较长文件之间平均分配，
+    任何文件都不会因为排在前面而挤占后面文件的份额。返回与 lengths 同序的配额列表。
+    """
+    quotas = [0] * len(lengths)
+    remaining = max(0, budget)
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    for rank, i in enumerate(order):
+        share = remaining // (len(order) - rank)
+        quotas[i] = min(lengths[i], share)
+        remaining -= quotas[i]
+    return quotas
+
+def read_knowledge_base(kb_path, is_dir, shuffle_files=False, use_cache=True, workers=None,
+                        budget_chars=DEFAULT_BUDGET_CHARS, return_report=False,
+                        budget_tokens=None, provider="default"):
+    """
+    读取知识库（单文件或文件夹），总长度控制在 budget_chars 字符以内；
+    指定 budget_tokens 时改为按 provider 的 token 估算分配与截断 (report 中的 end 仍为字符偏移)
+    use_cache=True 时通过解析缓存读取，未变化的文件不会重复解析
+    workers > 1 时用进程池并行解析；未命中缓存的 PDF/xlsx 解析到总预算对应的长度即停止
+    每个文件只解析一次，按实际长度用 allocate_budget 分配配额；
+    return_report=True 时额外返回 [{"file", "length", "start", "end", "truncated"}]，说明各文件纳入的范围
     """
-    doc_content = ""
     if is_dir:
-        if not os.path.exists(kb_path): return ""
-        
-        file_list = []
-        for root, dirs, files in os.walk(kb_path):
-            for file in files:
-                if file.lower().endswith(('.txt', '.md', '.json', '.docx', '.pdf', '.xlsx')):
-                    file_list.append(os.path.join(root, file))
-        
+        if not os.path.exists(kb_path):
+            return ("", []) if return_report else ""
+        file_list = list_knowledge_files(kb_path)
         if shuffle_files:
             random.shuffle(file_list)
-        else:
-            file_list.sort()
-            
-        # 智能分配每个文件的字符配额，确保多文件时能覆盖更多文档
-        total_limit = 500000
-        num_files = len(file_list)
-        # 基础配额：总限制除以文件数，但单文件最少给 10k (除非总限制不够)，最多不限制
-        # 如果文件很多，优先保证前面的文件能读入，但限制单个文件大小，避免一个文件占满
-        per_file_limit = int(total_limit / max(1, num_files))
-        # 修正配额：如果文件很少，允许单个文件更大；如果文件很多，限制每个文件大小
-        # 这里采用一个策略：单文件最大允许 500k (即 total_limit)，但如果有多个文件，
-        # 我们希望至少能读入前 N 个文件。
-        # 简单策略：如果文件数 > 1，强制限制每个文件最大占用 total_limit / 2 或 total_limit / num_files 的较大者
-        # 这样至少能读入 2 个文件。
-        # 更优策略：动态配额。
-        
-        if num_files > 1:
-            per_file_limit = max(int(total_limit / num_files), 20000) # 至少给20k，除非...
-            # 但如果 per_file_limit * num_files > total_limit，后面的文件还是进不来。
-            # 关键是防止前面的文件太大。
-            # 让我们设定一个硬限制：单个文件最多占用 50% 的总配额 (如果有 >1 个文件)
-            # 或者更简单：max_per_file = 500000
-            pass 
-
-        current_total = 0
-        
-        for file_path in file_list:
-            content = read_file_content(file_path)
-            if content:
-                # 计算该文件允许的最大长度
-                # 策略：如果有多个文件，限制单个文件不能超过剩余空间的 80% (为了给后面留点？不，这会导致太小)
-                # 策略：限制单个文件最大 100k (如果有多个文件)
-                
-                limit_for_this_file = len(content)
-                if num_files > 1:
-                    # 动态调整：总配额 50w。如果有 5 个文件，平均 10w。
-                    # 强制限制：单个文件不超过 20w (为了至少容纳 2.5 个大文件)
-                    # 或者不超过 total_limit / num_files * 2
-                    avg_quota = int(total_limit / num_files)
-                    limit_for_this_file = min(len(content), max(avg_quota * 2, 50000))
-                
-                if len(content) > limit_for_this_file:
-                     content = content[:limit_for_this_file] + "...(部分截断)"
-                
-                # 检查加入后是否超总限
-                if current_total + len(content) > total_limit:
-                    remaining = total_limit - current_total
-                    if remaining > 100: # 如果还能塞点东西
-                        content = content[:remaining] + "...(总长截断)"
-                        doc_content += f"\n\n--- 文档: {os.path.basename(file_path)} ---\n{content}"
-                    break
-                
-                doc_content += f"\n\n--- 文档: {os.path.basename(file_path)} ---\n{content}"
-                current_total += len(content)
-                
     else:
-        doc_content = read_file_content(kb_path)
-        
-    # 简单截断保护 (从 50k 增加到 500k)
-    if len(doc_content) > 500000:
-        doc_content = doc_content[:500000] + "...(截断)..."
+        file_list = [kb_path]
+
+    # 单个文件不可能分到超过总预算的配额，据此提前停止解析 (多 1 个字符以便仍能标记截断)
+    if budget_tokens:
+        max_chars = get_token_estimator(provider).max_chars(budget_tokens) + 1
+    else:
+        max_chars = budget_chars + 1 if budget_chars else None
+    parsed = dict(iter_parsed_files(file_list, workers, use_cache, max_chars))
+
+    contents = [parsed.get(path) or "" for path in file_list]
+    if budget_tokens:
+        estimator = get_token_estimator(provider)
+        quotas = allocate_budget([estimator.count(c) for c in contents], budget_tokens)
+        # 将 token 配额换算为字符截断位置
+        quotas = [len(estimator.truncate(c, q)) for c, q in zip(contents, quotas)]
+    else:
+        quotas = allocate_budget([len(c) for c in contents], budget_chars)
+
+    parts = []
+    report = []
+    for path, content, quota in zip(file_list, contents, quotas):
+        if not content:
+            continue
+        truncated = quota < len(content)
+        report.append({
+            "file": os.path.basename(path),
+            "length": len(content),
+            "start": 0,
+            "end": quota,
+            "truncated": truncated
+        })
+        if quota <= 0:
+            continue
+        text = content[:quota] + ("...(部分截断)" if truncated else "")
+        if is_dir:
+            parts.append(f"\n\n--- 文档: {os.path.basename(path)} ---\n{text}")
+        else:
+            parts.append(text)
+
+    doc_content = "".join(parts)
+    if return_report:
+        return doc_content, report
     return doc_content
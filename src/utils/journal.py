@@ -0,0 +1,105 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+DEFAULT_JOURNAL_DIR = "outputs/journals"
+
+def item_id(item):
+    """
+    用例的稳定 id：优先使用记录自带的 id，否则取问题文本的哈希 (生成阶段已对问题去重)
+    """
+    if item.get('id'):
+        return str(item['id'])
+    return hashlib.sha1(str(item.get('question', '')).strip().encode('utf-8')).hexdigest()[:16]
+
+def journal_path(stage, *parts, journal_dir=DEFAULT_JOURNAL_DIR):
+    """
+    按阶段及其输入/参数计算日志文件路径，同一输入和参数的重跑会找到同一个日志
+    """
+    key = hashlib.sha1("|".join(str(p) for p in parts).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(journal_dir, f"{stage}_{key}.jsonl")
+
+class RunJournal:
+    """
+    阶段运行日志：每完成一条就追加一行 {"item_id", "record"} (JSONL)。
+    每条写入后 flush，fsync 按批进行 (累计 fsync_every 条或距上次超过 fsync_interval 秒)，
+    崩溃时最多丢失最后一批；读取时截掉写了一半的末行，中间损坏的行打印警告后跳过 (该条会重新处理)。
+    """
+
+    def __init__(self, path, fsync_every=20, fsync_interval=1.0):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._file = None
+        self._pending = 0
+        self._last_sync = time.time()
+        # 本次运行追加的条数
+        self.appended = 0
+
+    def load(self):
+        """
+        返回已完成的 {item_id: record} (按写入顺序)
+        """
+        done = {}
+        if not os.path.exists(self.path):
+            return done
+        corrupt = []
+        valid_end = 0
+        offset = 0
+        with open(self.path, 'rb') as f:
+            for lineno, line in enumerate(f, 1):
+                offset += len(line)
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line.decode('utf-8'))
+                    done[entry['item_id']] = entry['record']
+                except (ValueError, KeyError, TypeError):
+                    corrupt.append(lineno)
+                    continue
+                valid_end = offset
+        if corrupt and offset > valid_end:
+            # 崩溃时写了一半的末行：截掉，否则后续追加会接在半行后面
+            corrupt.pop()
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid_end)
+        if corrupt:
+            print(f"运行日志 {self.path} 第 {', '.join(map(str, corrupt))} 行已损坏，已跳过，对应条目将重新处理")
+        return done
+
+    def append(self, record_id, record):
+        line = json.dumps({"item_id": record_id, "record": record}, ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(line)
+            self._file.flush()
+            self.appended += 1
+            self._pending += 1
+            if self._pending >= self.fsync_every or time.time() - self._last_sync >= self.fsync_interval:
+                self._sync()
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.time()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                if self._pending:
+                    self._sync()
+                self._file.close()
+                self._file = None
+
+    def discard(self):
+        """
+        阶段结果已完整写出后删除日志
+        """
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,280 @@
+import os
+import re
+import json
+import bisect
+import hashlib
+from src.utils.file_loader import iter_parsed_files, list_knowledge_files, is_parse_failure
+from src.utils.parse_cache import file_sha256
+
+DEFAULT_CHUNK_SIZE = 800
+DEFAULT_INDEX_DIR = "outputs/kb_index"
+
+# 常见标题格式：Markdown 标题、"一、"、"第X章"、"1." / "1.2 "、罗马数字 "II."
+HEADING_PATTERN = re.compile(
+    r"^(#{1,6}\s+\S|[一二三四五六七八九十]+、|第[一二三四五六七八九十百0-9]+[章节部分条]|\d+(\.\d+)*[\.、]?\s+\S|[IVX]+\.\s+\S)"
+)
+
+def _is_heading(line):
+    line = line.strip()
+    return 0 < len(line) <= 60 and bool(HEADING_PATTERN.match(line))
+
+def split_into_chunks(text, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    按段落/标题切分文本，返回 [(start, end, heading)]，偏移均相对于 text。
+    标题行总是开启新块；段落累积到 chunk_size 左右再切分；超长段落按 chunk_size 硬切。
+    """
+    spans = []
+    heading = ""
+    chunk_start = None
+    chunk_end = None
+    chunk_heading = ""
+    has_body = False
+
+    def flush():
+        if chunk_start is not None and text[chunk_start:chunk_end].strip():
+            spans.append((chunk_start, chunk_end, chunk_heading))
+
+    for match in re.finditer(r"[^\n]*(\n|$)", text):
+        start, end = match.start(), match.end()
+        if start == end:
+            break
+        line = match.group(0)
+        if _is_heading(line):
+            heading = line.strip()
+            if chunk_start is not None and not has_body:
+                # 连续标题 (如 "一、" 后紧跟 "1.") 合并到同一块，标题取最近一级
+                chunk_end, chunk_heading = end, heading
+                continue
+            flush()
+            chunk_start, chunk_end, chunk_heading = start, end, heading
+            has_body = False
+            continue
+        if chunk_start is not None and end - chunk_start > chunk_size and has_body:
+            flush()
+            chunk_start = None
+        if chunk_start is None:
+            chunk_start, chunk_heading = start, heading
+        chunk_end = end
+        if line.strip():
+            has_body = True
+        # 单个段落本身超长时硬切
+        while chunk_end - chunk_start > chunk_size * 2:
+            spans.append((chunk_start, chunk_start + chunk_size, chunk_heading))
+            chunk_start += chunk_size
+    flush()
+    return spans
+
+def _fingerprint(file_list, chunk_size):
+    h = hashlib.sha1(str(chunk_size).encode('utf-8'))
+    for path in file_list:
+        st = os.stat(path)
+        h.update(f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}\n".encode('utf-8'))
+    return h.hexdigest()
+
+class KnowledgeBase:
+    """
+    分块索引后的知识库。chunks 中每个元素:
+    {"id", "file", "start", "end", "heading", "text"}，start/end 为该块在所属文件文本中的偏移；
+    PDF 的块另有 page_start/page_end (从 0 开始、不含 page_end)，可直接传给 iter_pdf_pages 重新抽取对应页面。
+    files 记录每个文件的路径、长度及其块在 chunks 列表中的位置范围。
+    chunk id 在增量更新中保持稳定 (删除文件不会导致其他块重新编号)。
+    manifest 记录每个文件上次索引时的 size/mtime/sha256，用于增量更新时的变更检测。
+    """
+
+    def __init__(self, chunks=None, files=None, fingerprint=None, manifest=None, next_id=None, name=None):
+        self.chunks = chunks or []
+        self.files = files or []
+        self.fingerprint = fingerprint
+        self.manifest = manifest or {}
+        self.next_id = next_id if next_id is not None else (max((c['id'] for c in self.chunks), default=-1) + 1)
+        self.name = name
+        self._by_id = {c['id']: c for c in self.chunks}
+
+    def add_file(self, path, content, chunk_size=DEFAULT_CHUNK_SIZE, page_starts=None):
+        """
+        page_starts 为 PDF 各页在 content 中的起始偏移 [(page_index, offset)]，据此为每个块记录页码范围
+        """
+        name = os.path.basename(path)
+        first = len(self.chunks)
+        offsets = [offset for _, offset in page_starts or []]
+        for start, end, heading in split_into_chunks(content or "", chunk_size):
+            chunk = {
+                "id": self.next_id,
+                "file": name,
+                "start": start,
+                "end": end,
+                "heading": heading,
+                "text": content[start:end]
+            }
+            if offsets:
+                chunk["page_start"] = page_starts[max(0, bisect.bisect_right(offsets, start) - 1)][0]
+                chunk["page_end"] = page_starts[max(0, bisect.bisect_left(offsets, end) - 1)][0] + 1
+            self.next_id += 1
+            self.chunks.append(chunk)
+            self._by_id[chunk['id']] = chunk
+        self.files.append({
+            "path": path,
+            "name": name,
+            "length": len(content or ""),
+            "chunk_start": first,
+            "chunk_end": len(self.chunks)
+        })
+
+    def remove_file(self, path):
+        target = os.path.abspath(path)
+        kept_files = []
+        kept_chunks = []
+        for f in self.files:
+            if os.path.abspath(f['path']) == target:
+                continue
+            chunks = self.chunks[f['chunk_start']:f['chunk_end']]
+            kept_files.append(dict(f, chunk_start=len(kept_chunks), chunk_end=len(kept_chunks) + len(chunks)))
+            kept_chunks.extend(chunks)
+        self.files = kept_files
+        self.chunks = kept_chunks
+        self._by_id = {c['id']: c for c in self.chunks}
+
+    def sort_files(self):
+        """
+        按文件路径重新排列文件及其块 (增量更新后保持与全量构建一致的顺序)
+        """
+        ordered_files = []
+        ordered_chunks = []
+        for f in sorted(self.files, key=lambda f: f['path']):
+            chunks = self.chunks[f['chunk_start']:f['chunk_end']]
+            ordered_files.append(dict(f, chunk_start=len(ordered_chunks), chunk_end=len(ordered_chunks) + len(chunks)))
+            ordered_chunks.extend(chunks)
+        self.files = ordered_files
+        self.chunks = ordered_chunks
+
+    def get_chunk(self, chunk_id):
+        return self._by_id.get(chunk_id)
+
+    def get_chunks(self, chunk_ids):
+        return [self._by_id[i] for i in chunk_ids if i in self._by_id]
+
+    def format_chunks(self, chunk_ids):
+        """
+        将选中的块拼成带来源标注的文本，供 prompt 使用
+        """
+        parts = []
+        for chunk in self.get_chunks(chunk_ids):
+            title = f"{chunk['file']} / {chunk['heading']}" if chunk['heading'] else chunk['file']
+            if 'page_start' in chunk:
+                title += f" (第 {chunk['page_start'] + 1}-{chunk['page_end']} 页)"
+            parts.append(f"--- [{chunk['id']}] {title} ---\n{chunk['text'].strip()}")
+        return "\n\n".join(parts)
+
+    def save(self, path):
+        """
+        原子写入：先写临时文件再 os.replace，中途崩溃不会留下半个索引/清单
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding='utf-8') as f:
+            json.dump({
+                "fingerprint": self.fingerprint,
+                "next_id": self.next_id,
+                "manifest": self.manifest,
+                "files": self.files,
+                "chunks": self.chunks
+            }, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['chunks'], data['files'], data.get('fingerprint'), data.get('manifest'), data.get('next_id'))
+
+class IncrementalIngester:
+    """
+    基于清单 (manifest) 的增量导入：对比上次索引时记录的 size/mtime/sha256，
+    找出新增、修改、删除的文件，只重新解析/分块这些文件，其余块原样保留 (id 不变)。
+    """
+
+    def __init__(self, kb_path, is_dir=True, chunk_size=DEFAULT_CHUNK_SIZE, index_dir=DEFAULT_INDEX_DIR, workers=None):
+        self.kb_path = kb_path
+        self.is_dir = is_dir
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.key = hashlib.sha1(f"{os.path.abspath(kb_path)}|{chunk_size}".encode('utf-8')).hexdigest()[:16]
+        self.index_file = os.path.join(index_dir, f"kb_{self.key}.json")
+
+    def _load_existing(self):
+        if os.path.exists(self.index_file):
+            try:
+                return KnowledgeBase.load(self.index_file)
+            except Exception as e:
+                print(f"知识库索引读取失败，将重新构建: {e}")
+        return KnowledgeBase()
+
+    def detect_changes(self, kb, file_list):
+        """
+        返回 (added, modified, removed, touched)，touched 为仅 mtime 变化但内容未变的文件
+        """
+        current = {os.path.abspath(p): p for p in file_list}
+        added, modified, touched = [], [], []
+        for abs_path, path in current.items():
+            record = kb.manifest.get(abs_path)
+            if record is None:
+                added.append(path)
+                continue
+            st = os.stat(path)
+            if record['size'] == st.st_size and record['mtime_ns'] == st.st_mtime_ns:
+                continue
+            if record['size'] == st.st_size and record.get('sha256') == file_sha256(path):
+                touched.append(path)
+            else:
+                modified.append(path)
+        removed = [record_path for record_path in kb.manifest if record_path not in current]
+        return added, modified, removed, touched
+
+    def _record(self, path):
+        st = os.stat(path)
+        return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": file_sha256(path)}
+
+    def update(self):
+        file_list = list_knowledge_files(self.kb_path) if self.is_dir else [self.kb_path]
+        kb = self._load_existing()
+        kb.name = self.key
+        fingerprint = _fingerprint(file_list, self.chunk_size)
+        if kb.fingerprint == fingerprint:
+            return kb
+
+        added, modified, removed, touched = self.detect_changes(kb, file_list)
+        for path in removed + modified:
+            kb.remove_file(path)
+            kb.manifest.pop(os.path.abspath(path), None)
+
+        to_parse = added + modified
+        # 解析按完成顺序返回，分块时仍按文件列表顺序，保证 chunk id 稳定
+        parsed = {path: (content, info) for path, content, info in iter_parsed_files(to_parse, self.workers, with_info=True)}
+        failed = []
+        for path in to_parse:
+            content, info = parsed.get(path, ("", {}))
+            if is_parse_failure(content):
+                # 不建入索引也不记入清单，下次 update 时按新增文件重试
+                failed.append(path)
+                continue
+            kb.add_file(path, content, self.chunk_size, info.get('page_starts'))
+            kb.manifest[os.path.abspath(path)] = self._record(path)
+        for path in touched:
+            kb.manifest[os.path.abspath(path)] = self._record(path)
+
+        kb.sort_files()
+        # 有文件解析失败时不记录指纹，否则下次会走"未变化"的快速路径而不再重试
+        kb.fingerprint = None if failed else fingerprint
+        kb.save(self.index_file)
+        print(f"知识库增量更新: 新增 {len(added)}, 修改 {len(modified)}, 删除 {len(removed)}, 仅时间戳变化 {len(touched)}")
+        if failed:
+            print(f"解析失败 {len(failed)} 个文件，未建入索引，下次加载时重试: {', '.join(os.path.basename(p) for p in failed)}")
+        return kb
+
+def load_knowledge_base(kb_path, is_dir, chunk_size=DEFAULT_CHUNK_SIZE, index_dir=DEFAULT_INDEX_DIR, workers=None):
+    """
+    加载知识库索引：未变化时直接读取磁盘上的索引，否则只增量处理变化的文件并保存
+    """
+    return IncrementalIngester(kb_path, is_dir, chunk_size, index_dir, workers).update()
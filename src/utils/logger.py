@@ -1,7 +1,7 @@
-import wx
 import datetime
 
 # 全局 Debug 输出函数 (将在 MainFrame 中被绑定)
+# wx 只在绑定了界面控件后才导入，命令行模式下不依赖图形界面
 DEBUG_OUTPUT_CTRL = None
 
 def set_debug_ctrl(ctrl):
@@ -10,6 +10,7 @@ def set_debug_ctrl(ctrl):
 
 def log_debug(message):
     if DEBUG_OUTPUT_CTRL:
+        import wx
         # 确保在主线程更新 UI
         wx.CallAfter(DEBUG_OUTPUT_CTRL.AppendText, f"[{datetime.datetime.now().strftime('%H:%M:%S')}] {message}\n")
     # 同时打印到控制台
@@ -20,6 +21,7 @@ class RedirectText(object):
         self.out = text_ctrl
 
     def write(self, string):
+        import wx
         wx.CallAfter(self.out.AppendText, string)
 
     def flush(self):
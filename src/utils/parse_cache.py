@@ -0,0 +1,105 @@
+import os
+import json
+import hashlib
+import threading
+
+DEFAULT_PARSE_CACHE_DIR = "outputs/cache/parsed"
+
+def file_sha256(path, block_size=1024 * 1024):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+class ParseCache:
+    """
+    文档解析结果缓存：每个源文件对应 cache_dir 下一个 JSON 条目，
+    记录 mtime/size/sha256、抽取出的文本与元数据。
+    - mtime 与 size 均未变化时直接命中 (verify_hash=True 时还要求内容哈希一致)
+    - 只有 mtime 变化 (如被 touch/复制) 但哈希一致时同样命中，并刷新记录的 mtime
+    """
+
+    def __init__(self, cache_dir=DEFAULT_PARSE_CACHE_DIR, verify_hash=False, enabled=True):
+        self.cache_dir = cache_dir
+        self.verify_hash = verify_hash
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _entry_path(self, path):
+        key = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _load_entry(self, path):
+        entry_path = self._entry_path(path)
+        if not os.path.exists(entry_path):
+            return None
+        try:
+            with open(entry_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception:
+            return None
+
+    def _write_entry(self, path, entry):
+        entry_path = self._entry_path(path)
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        tmp_path = f"{entry_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, entry_path)
+
+    def get(self, path):
+        """
+        返回缓存的 {"text", "metadata", ...}，失效或不存在时返回 None
+        """
+        if not self.enabled:
+            return None
+        entry = self._load_entry(path)
+        st = os.stat(path)
+        hit = False
+        if entry and entry.get('size') == st.st_size:
+            if entry.get('mtime_ns') == st.st_mtime_ns:
+                hit = not self.verify_hash or entry.get('sha256') == file_sha256(path)
+            elif entry.get('sha256') and entry['sha256'] == file_sha256(path):
+                entry['mtime_ns'] = st.st_mtime_ns
+                self._write_entry(path, entry)
+                hit = True
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return entry if hit else None
+
+    def put(self, path, text, metadata=None):
+        if not self.enabled:
+            return
+        st = os.stat(path)
+        entry = {
+            "path": os.path.abspath(path),
+            "mtime_ns": st.st_mtime_ns,
+            "size": st.st_size,
+            "sha256": file_sha256(path),
+            "text": text,
+            "metadata": metadata or {}
+        }
+        self._write_entry(path, entry)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+_DEFAULT_CACHE = None
+_DEFAULT_CACHE_LOCK = threading.Lock()
+
+def get_default_parse_cache():
+    """
+    进程内共享的默认解析缓存。设置环境变量 RAG_PARSE_CACHE=off 可旁路缓存。
+    """
+    global _DEFAULT_CACHE
+    with _DEFAULT_CACHE_LOCK:
+        if _DEFAULT_CACHE is None:
+            enabled = os.environ.get("RAG_PARSE_CACHE", "on").lower() not in ("0", "off", "false", "no")
+            _DEFAULT_CACHE = ParseCache(enabled=enabled)
+        return _DEFAULT_CACHE
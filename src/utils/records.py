@@ -0,0 +1,108 @@
+import os
+import json
+
+# 各阶段输入/输出的记录文件格式：
+# .jsonl 为 JSON Lines (一行一条记录，可边写边读，默认格式)；.json 为旧版的单个 JSON 数组 (仍可读写)
+DEFAULT_FORMAT = "jsonl"
+
+def is_jsonl(path):
+    return os.path.splitext(path)[1].lower() == ".jsonl"
+
+def _is_json_array(f):
+    # 按首个非空白字符判断，兼容扩展名与内容不符的旧文件
+    while True:
+        ch = f.read(1)
+        if not ch:
+            return False
+        if not ch.isspace():
+            f.seek(0)
+            return ch == '['
+
+def iter_records(path):
+    """
+    逐条读取记录文件：JSON Lines 按行流式解析 (内存占用与文件大小无关)，
+    旧版 JSON 数组文件整体加载后逐条产出。跳过空行与写了一半的末行；
+    中间某行无法解析时抛出 ValueError (文件已损坏，不静默丢弃记录)。
+    """
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        if _is_json_array(f):
+            for record in json.load(f):
+                yield record
+            return
+        bad_line = None
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            if bad_line is not None:
+                raise ValueError(f"{path} 第 {bad_line} 行不是合法的 JSON，文件可能已损坏")
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # 运行中的文件末行可能尚未写完，只有后面再没有记录时才允许
+                bad_line = lineno
+                continue
+            yield record
+
+def read_records(path):
+    return list(iter_records(path))
+
+def count_records(path):
+    """
+    统计记录条数 (JSON Lines 只数行，不解析内容)
+    """
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        if _is_json_array(f):
+            return len(json.load(f))
+        return sum(1 for line in f if line.strip())
+
+class RecordWriter:
+    """
+    流式写出记录：每次 write 立即写入并 flush，运行过程中即可读取已写出的部分。
+    路径扩展名为 .jsonl 时一行一条；否则写成旧版 JSON 数组 (indent=2)，close 时补上结尾。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.jsonl = is_jsonl(path)
+        self.count = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'w', encoding='utf-8')
+        if not self.jsonl:
+            self._file.write("[")
+
+    def write(self, record):
+        if self.jsonl:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        else:
+            text = json.dumps(record, ensure_ascii=False, indent=2)
+            self._file.write(("," if self.count else "") + "\n  " + text.replace("\n", "\n  "))
+        self._file.flush()
+        self.count += 1
+
+    def close(self):
+        if self._file is None:
+            return
+        if not self.jsonl:
+            self._file.write("\n]" if self.count else "]")
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def write_records(path, records):
+    with RecordWriter(path) as writer:
+        for record in records:
+            writer.write(record)
+    return path
+
+def convert_records(src_path, dst_path):
+    """
+    按目标扩展名转换格式 (如 .jsonl 导出为 .json)，逐条流式复制
+    """
+    return write_records(dst_path, iter_records(src_path))
@@ -0,0 +1,182 @@
+import os
+import json
+import pandas as pd
+from src.utils.records import read_records, RecordWriter
+
+# pyarrow 为可选依赖：未安装时评分结果退回 JSON Lines
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+SCORE_COLUMNS = ['faithfulness_score', 'completeness_score', 'relevance_score']
+
+def _result_schema():
+    category = pa.dictionary(pa.int32(), pa.string())
+    fields = [
+        ("question", pa.string()),
+        ("type", category),
+        ("sim_style", category),
+        ("reference_answer", pa.string()),
+        ("evaluation_criteria", pa.string()),
+        ("rag_answer", pa.string()),
+        ("faithfulness_score", pa.float32()),
+        ("completeness_score", pa.float32()),
+        ("relevance_score", pa.float32()),
+        ("faithfulness_reason", pa.string()),
+        ("completeness_reason", pa.string()),
+        ("relevance_reason", pa.string()),
+        ("latency", pa.float64()),
+        ("retrieval_latency", pa.float64()),
+        ("fusion_latency", pa.float64()),
+        ("generation_latency", pa.float64()),
+        ("throttle_wait", pa.float64()),
+        ("retrieved_chunks", pa.list_(pa.int32())),
+        # 评分失败的原因 (此时各项分数为空)
+        ("error", pa.string()),
+        # 其余字段 (如 retriever_latencies) 以 JSON 文本保存，读取时还原
+        ("extra", pa.string()),
+    ]
+    return pa.schema(fields)
+
+def parquet_available():
+    return pa is not None
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _to_text(value):
+    if value is None:
+        return None
+    return value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+
+def _to_chunks(value):
+    if not isinstance(value, list):
+        return None
+    return [int(v) for v in value if isinstance(v, (int, float))]
+
+class ResultsWriter:
+    """
+    评分结果的列式存储 (Parquet)：分数为 float32 列，type/sim_style 为字典编码的分类列。
+    按 batch_size 条一组写入行组，内存占用与总条数无关；接口与 RecordWriter 一致 (write/close)。
+    """
+
+    def __init__(self, path, batch_size=1000):
+        if pa is None:
+            raise ImportError("写入 Parquet 需要安装 pyarrow")
+        self.path = path
+        self.batch_size = batch_size
+        self.count = 0
+        self.schema = _result_schema()
+        self._known = set(self.schema.names) - {"extra"}
+        self._rows = []
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+
+    def write(self, record):
+        self._rows.append(record)
+        self.count += 1
+        if len(self._rows) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._rows:
+            return
+        rows = self._rows
+        self._rows = []
+        columns = {}
+        for field in self.schema:
+            name = field.name
+            if name == "extra":
+                values = []
+                for rec in rows:
+                    extra = {k: v for k, v in rec.items() if k not in self._known}
+                    values.append(json.dumps(extra, ensure_ascii=False) if extra else None)
+            elif pa.types.is_floating(field.type):
+                values = [_to_float(rec.get(name)) for rec in rows]
+            elif pa.types.is_list(field.type):
+                values = [_to_chunks(rec.get(name)) for rec in rows]
+            else:
+                values = [_to_text(rec.get(name)) for rec in rows]
+            if pa.types.is_dictionary(field.type):
+                columns[name] = pa.array(values, pa.string()).dictionary_encode()
+            else:
+                columns[name] = pa.array(values, field.type)
+        self._writer.write_table(pa.table(columns, schema=self.schema))
+
+    def close(self):
+        if self._writer is None:
+            return
+        self._flush()
+        self._writer.close()
+        self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def open_results_writer(path):
+    """
+    按扩展名选择评分结果的写出方式：.parquet 为列式存储，其余为 JSON Lines / JSON 数组
+    """
+    if path.endswith(".parquet"):
+        return ResultsWriter(path)
+    return RecordWriter(path)
+
+def load_results(path, columns=None):
+    """
+    读取评分结果为 DataFrame (Parquet 或 JSONL/JSON)。Parquet 的分类列读取为 pandas Categorical，
+    可只读取 columns 指定的列；extra 中的其余字段会还原为普通列。
+    """
+    if not path.endswith(".parquet"):
+        df = pd.DataFrame(read_records(path))
+        return df[columns] if columns else df
+    df = pq.read_table(path, columns=columns).to_pandas()
+    if "extra" in df.columns:
+        extra = df.pop("extra")
+        if extra.notna().any():
+            expanded = pd.DataFrame([json.loads(v) if v else {} for v in extra], index=df.index)
+            df = df.join(expanded)
+    return df
+
+def summarize_results(path, by="type"):
+    """
+    按分类列 (type / sim_style) 汇总条数、评分失败条数 (failed) 与各项平均分；
+    评分失败的条目分数为空，不计入平均分。Parquet 只读取所需的几列并在 Arrow 中聚合
+    """
+    if not path.endswith(".parquet"):
+        df = load_results(path)
+        if df.empty or by not in df.columns:
+            return []
+        scores = df[SCORE_COLUMNS].apply(pd.to_numeric, errors="coerce")
+        grouped = scores.groupby(df[by])
+        summary = grouped.mean()
+        summary["count"] = grouped.size()
+        summary["failed"] = summary["count"] - grouped[SCORE_COLUMNS[0]].count()
+        return summary.reset_index().to_dict(orient="records")
+    table = pq.read_table(path, columns=[by] + SCORE_COLUMNS)
+    # group_by 不支持字典类型的键，先解码为普通字符串列
+    table = table.set_column(0, by, table.column(by).cast(pa.string()))
+    # count 默认只统计非空值：按分组键计为总条数，按分数列计为评分成功的条数
+    aggregations = [(c, "mean") for c in SCORE_COLUMNS] + [(by, "count"), (SCORE_COLUMNS[0], "count")]
+    summary = table.group_by(by).aggregate(aggregations)
+    return [
+        {by: row[by], "count": row[f"{by}_count"], "failed": row[f"{by}_count"] - row[f"{SCORE_COLUMNS[0]}_count"],
+         **{c: row[f"{c}_mean"] for c in SCORE_COLUMNS}}
+        for row in summary.to_pylist()
+    ]
+
+def export_excel(results_path, excel_path=None):
+    """
+    按需将评分结果导出为 xlsx (openpyxl 写入较慢，不再作为评分的默认输出)
+    """
+    excel_path = excel_path or os.path.splitext(results_path)[0] + ".xlsx"
+    load_results(results_path).to_excel(excel_path, index=False)
+    return excel_path
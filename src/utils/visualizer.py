@@ -57,9 +57,15 @@ def create_bar_chart(df):
     plt.close()
     return base64.b64encode(buf.getvalue()).decode('utf-8')
 
+def _score_cell(row, column):
+    value = row.get(column)
+    return "-" if value is None or pd.isna(value) else value
+
 def generate_html_report(df, output_file, timestamp):
-    radar_chart = create_radar_chart(df)
-    bar_chart = create_bar_chart(df)
+    # 评分失败的条目 (分数为空) 只在明细表中列出，不参与图表与平均分
+    scored = df.dropna(subset=['faithfulness_score', 'completeness_score', 'relevance_score'])
+    radar_chart = create_radar_chart(scored)
+    bar_chart = create_bar_chart(scored)
     
     html_content = f"""
     <html>
@@ -83,6 +89,7 @@ def generate_html_report(df, output_file, timestamp):
         <div class="container">
             <h1>RAG 系统自动化评估报告</h1>
             <p>测试时间: {timestamp}</p>
+            <p>评分成功 {len(scored)} 条，评分失败 {len(df) - len(scored)} 条 (未计入图表与平均分)</p>
             
             <div class="charts">
                 <div class="chart-box">
@@ -123,9 +130,9 @@ def generate_html_report(df, output_file, timestamp):
                             相关性: {row.get('relevance_reason','')}
                         </td>
                         <td>
-                            忠: <span class="score">{row.get('faithfulness_score',0)}</span><br/>
-                            完: <span class="score">{row.get('completeness_score',0)}</span><br/>
-                            相: <span class="score">{row.get('relevance_score',0)}</span>
+                            忠: <span class="score">{_score_cell(row, 'faithfulness_score')}</span><br/>
+                            完: <span class="score">{_score_cell(row, 'completeness_score')}</span><br/>
+                            相: <span class="score">{_score_cell(row, 'relevance_score')}</span>
                         </td>
                     </tr>
         """